@@ -4,6 +4,7 @@ from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.api.deps import get_current_user
+from app.api.users import check_user_conflicts
 from app.core.database import get_db
 from app.core.security import create_access_token, get_password_hash, verify_password
 from app.models.user import User
@@ -17,16 +18,15 @@ router = APIRouter()
 )
 async def register(user_in: UserCreate, db: AsyncSession = Depends(get_db)):
     """用户注册"""
-    # 检查用户名是否已存在
-    result = await db.execute(select(User).where(User.username == user_in.username))
-    if result.scalar_one_or_none():
+    # 检查用户名、邮箱是否已存在 (一次查询)
+    username_taken, email_taken = await check_user_conflicts(
+        db, user_in.username, user_in.email
+    )
+    if username_taken:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, detail="用户名已存在"
         )
-
-    # 检查邮箱是否已存在
-    result = await db.execute(select(User).where(User.email == user_in.email))
-    if result.scalar_one_or_none():
+    if email_taken:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, detail="邮箱已被注册"
         )
@@ -35,7 +35,7 @@ async def register(user_in: UserCreate, db: AsyncSession = Depends(get_db)):
     user = User(
         username=user_in.username,
         email=user_in.email,
-        password_hash=get_password_hash(user_in.password),
+        password_hash=await get_password_hash(user_in.password),
         role=user_in.role,
     )
     db.add(user)
@@ -54,7 +54,7 @@ async def login(
     result = await db.execute(select(User).where(User.username == form_data.username))
     user = result.scalar_one_or_none()
 
-    if not user or not verify_password(form_data.password, user.password_hash):
+    if not user or not await verify_password(form_data.password, user.password_hash):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="用户名或密码错误",
@@ -3,10 +3,13 @@ from datetime import datetime, timedelta, timezone
 from typing import List, Optional
 
 from fastapi import APIRouter, Depends, HTTPException, Query, Request
-from sqlalchemy import func, select
+from sqlalchemy import DateTime, bindparam, func, insert, literal, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import raiseload
 
-from app.api.deps import get_current_user
+from app.api.deps import get_current_user, invalidate_auth_session_cache
+from app.core.cache import cache_delete, cache_get_json, cache_set_json
 from app.core.database import get_db
 from app.models.auth_code import AuthCode, AuthCodeReviewedItem, AuthCodeSession
 from app.models.dataset import Dataset
@@ -16,9 +19,59 @@ from app.schemas.auth_code import (
     AuthCodeResponse,
     AuthCodeVerifyResponse,
 )
+from app.services.online_counter import acquire_online_slot, release_online_slot
 
 router = APIRouter(prefix="/auth-codes", tags=["auth-codes"])
 
+# 授权码不可变字段的缓存时间（秒）
+AUTH_CODE_CACHE_TTL = 300
+
+
+# 按 code 查询的语句在模块级构建一次，请求时只绑定参数（走 code 唯一索引）
+_AUTH_CODE_SNAPSHOT_BY_CODE = select(
+    AuthCode.id,
+    AuthCode.dataset_id,
+    AuthCode.item_start,
+    AuthCode.item_end,
+    AuthCode.item_ids,
+    AuthCode.permission,
+    AuthCode.max_online,
+    AuthCode.expires_at,
+    AuthCode.is_active,
+).where(AuthCode.code == bindparam("code"))
+
+_AUTH_CODE_ID_BY_CODE = select(AuthCode.id).where(AuthCode.code == bindparam("code"))
+
+_AUTH_CODE_ID_BY_CODE_AND_CREATOR = _AUTH_CODE_ID_BY_CODE.where(
+    AuthCode.creator_id == bindparam("creator_id")
+)
+
+
+def auth_code_cache_key(code: str) -> str:
+    return f"authcode:{code}"
+
+
+async def get_auth_code_snapshot(db: AsyncSession, code: str) -> Optional[dict]:
+    """读取授权码的不可变字段（优先 Redis，未命中时回源数据库并回填）
+
+    计数字段（verify_count / current_online）不进缓存。
+    """
+    key = auth_code_cache_key(code)
+    snapshot = await cache_get_json(key)
+    if snapshot is not None:
+        return snapshot
+
+    result = await db.execute(_AUTH_CODE_SNAPSHOT_BY_CODE, {"code": code})
+    row = result.mappings().first()
+    if row is None:
+        return None
+
+    snapshot = dict(row)
+    if snapshot["expires_at"] is not None:
+        snapshot["expires_at"] = snapshot["expires_at"].isoformat()
+    await cache_set_json(key, snapshot, AUTH_CODE_CACHE_TTL)
+    return snapshot
+
 
 @router.post("", response_model=AuthCodeResponse)
 async def create_auth_code(
@@ -27,17 +80,7 @@ async def create_auth_code(
     current_user: User = Depends(get_current_user),
 ):
     """创建授权码"""
-    # 生成唯一的6位数字码
-    for _ in range(10):  # 最多尝试10次
-        code = AuthCode.generate_code()
-        existing = await db.execute(select(AuthCode).where(AuthCode.code == code))
-        if not existing.scalar_one_or_none():
-            break
-    else:
-        raise HTTPException(status_code=500, detail="无法生成唯一授权码")
-
-    auth_code = AuthCode(
-        code=code,
+    values = dict(
         dataset_id=data.dataset_id,
         item_start=data.item_start,
         item_end=data.item_end,
@@ -48,14 +91,24 @@ async def create_auth_code(
         expires_at=data.expires_at,
         creator_id=current_user.id,
     )
-    db.add(auth_code)
+
+    # 生成唯一的6位数字码：由 code 唯一索引判重，冲突时不插入并重新生成
+    for _ in range(10):  # 最多尝试10次
+        result = await db.execute(
+            pg_insert(AuthCode)
+            .values(code=AuthCode.generate_code(), **values)
+            .on_conflict_do_nothing(index_elements=[AuthCode.code])
+            .returning(AuthCode)
+        )
+        auth_code = result.scalar_one_or_none()
+        if auth_code is not None:
+            break
+    else:
+        raise HTTPException(status_code=500, detail="无法生成唯一授权码")
+
     await db.commit()
-    await db.refresh(auth_code)
 
-    return AuthCodeResponse(
-        **{k: v for k, v in auth_code.__dict__.items() if not k.startswith("_")},
-        reviewed_count=0,
-    )
+    return AuthCodeResponse.model_validate(auth_code)
 
 
 @router.get("/dataset/{dataset_id}", response_model=List[AuthCodeResponse])
@@ -65,24 +118,49 @@ async def list_auth_codes(
     current_user: User = Depends(get_current_user),
 ):
     """获取数据集的授权码列表"""
+    # 每个授权码的审核数用关联子查询统计，避免对 AuthCode 全列 GROUP BY
+    reviewed_count = (
+        select(func.count(AuthCodeReviewedItem.id))
+        .where(AuthCodeReviewedItem.auth_code_id == AuthCode.id)
+        .correlate(AuthCode)
+        .scalar_subquery()
+    )
     query = (
-        select(AuthCode, func.count(AuthCodeReviewedItem.id).label("reviewed_count"))
-        .outerjoin(AuthCodeReviewedItem)
+        select(AuthCode, reviewed_count.label("reviewed_count"))
+        .options(raiseload("*"))  # 只返回列数据，禁止隐式懒加载关系
         .where(AuthCode.dataset_id == dataset_id)
         .where(AuthCode.creator_id == current_user.id)
-        .group_by(AuthCode.id)
         .order_by(AuthCode.created_at.desc())
     )
     result = await db.execute(query)
-    rows = result.all()
 
-    return [
-        AuthCodeResponse(
-            **{k: v for k, v in row[0].__dict__.items() if not k.startswith("_")},
-            reviewed_count=row[1],
+    responses = []
+    for auth_code, count in result.tuples():
+        response = AuthCodeResponse.model_validate(auth_code)
+        response.reviewed_count = count
+        responses.append(response)
+    return responses
+
+
+async def _verify_failure_response(
+    db: AsyncSession, code: str, auth_code_id: int
+) -> AuthCodeVerifyResponse:
+    """冷路径：查询验证失败的具体原因"""
+    state = (
+        await db.execute(
+            select(
+                AuthCode.is_active,
+                AuthCode.verify_count,
+                AuthCode.max_verify_count,
+            ).where(AuthCode.id == auth_code_id)
         )
-        for row in rows
-    ]
+    ).first()
+    if state is None or not state.is_active:
+        await cache_delete(auth_code_cache_key(code))
+        return AuthCodeVerifyResponse(valid=False, message="授权码已被撤销")
+    if state.verify_count >= state.max_verify_count:
+        return AuthCodeVerifyResponse(valid=False, message="授权码验证次数已用尽")
+    return AuthCodeVerifyResponse(valid=False, message="授权码在线人数已满")
 
 
 @router.post("/{code}/verify", response_model=AuthCodeVerifyResponse)
@@ -91,40 +169,79 @@ async def verify_auth_code(
     db: AsyncSession = Depends(get_db),
 ):
     """验证授权码"""
-    result = await db.execute(select(AuthCode).where(AuthCode.code == code))
-    auth_code = result.scalar_one_or_none()
+    snapshot = await get_auth_code_snapshot(db, code)
 
-    if not auth_code:
+    if not snapshot:
         return AuthCodeVerifyResponse(valid=False, message="授权码不存在")
 
-    if not auth_code.is_active:
+    if not snapshot["is_active"]:
         return AuthCodeVerifyResponse(valid=False, message="授权码已被撤销")
 
     # 检查过期
-    if auth_code.expires_at and auth_code.expires_at < datetime.now(timezone.utc):
+    expires_at = snapshot["expires_at"]
+    if expires_at and datetime.fromisoformat(expires_at) < datetime.now(timezone.utc):
         return AuthCodeVerifyResponse(valid=False, message="授权码已过期")
 
-    # 检查验证次数
-    if auth_code.verify_count >= auth_code.max_verify_count:
-        return AuthCodeVerifyResponse(valid=False, message="授权码验证次数已用尽")
-
-    # 检查在线数
-    if auth_code.current_online >= auth_code.max_online:
-        return AuthCodeVerifyResponse(valid=False, message="授权码在线人数已满")
-
-    # 更新验证次数
-    auth_code.verify_count += 1
-    auth_code.current_online += 1
+    # 在线名额优先在 Redis 中原子占用；Redis 不可用时 (None) 退回数据库计数
+    online_slot = await acquire_online_slot(
+        db, snapshot["id"], snapshot["max_online"] or 0
+    )
+    if online_slot is False:
+        return await _verify_failure_response(db, code, snapshot["id"])
 
-    # 创建会话
+    # 单条语句完成：原子地检查并占用验证次数 (UPDATE)，
+    # 成功时写入会话 (INSERT)，并取回数据集源文件
     session_token = secrets.token_hex(32)
-    session = AuthCodeSession(
-        auth_code_id=auth_code.id,
-        session_token=session_token,
-        expires_at=datetime.utcnow() + timedelta(hours=24),
+    session_expires_at = datetime.utcnow() + timedelta(hours=24)
+    claim_conditions = [
+        AuthCode.id == snapshot["id"],
+        AuthCode.is_active.is_(True),
+        AuthCode.verify_count < AuthCode.max_verify_count,
+    ]
+    claim_values = {"verify_count": AuthCode.verify_count + 1}
+    if online_slot is None:
+        claim_conditions.append(AuthCode.current_online < AuthCode.max_online)
+        claim_values["current_online"] = AuthCode.current_online + 1
+    claimed = (
+        update(AuthCode)
+        .where(*claim_conditions)
+        .values(**claim_values)
+        .returning(
+            AuthCode.id,
+            select(Dataset.source_file)
+            .where(Dataset.id == AuthCode.dataset_id)
+            .scalar_subquery()
+            .label("source_file"),
+        )
+        .cte("claimed")
     )
-    db.add(session)
-    await db.commit()
+    try:
+        result = await db.execute(
+            insert(AuthCodeSession)
+            .from_select(
+                ["auth_code_id", "session_token", "expires_at"],
+                select(
+                    claimed.c.id,
+                    literal(session_token),
+                    literal(session_expires_at, DateTime(timezone=True)),
+                ),
+            )
+            .returning(select(claimed.c.source_file).scalar_subquery())
+        )
+        created = result.first()
+        if created is not None:
+            await db.commit()
+    except Exception:
+        if online_slot:
+            await release_online_slot(snapshot["id"])
+        raise
+
+    if created is None:
+        if online_slot:
+            await release_online_slot(snapshot["id"])
+        return await _verify_failure_response(db, code, snapshot["id"])
+
+    dataset_source_file = created[0]
 
     # log created session info
     try:
@@ -135,26 +252,22 @@ async def verify_auth_code(
             "auth_code verify created session",
             extra={
                 "code": code,
-                "auth_code_id": auth_code.id,
+                "auth_code_id": snapshot["id"],
                 "session_token": session_token,
-                "expires_at": session.expires_at,
+                "expires_at": session_expires_at,
             },
         )
     except Exception:
         pass
 
-    dataset_res = await db.execute(select(Dataset).where(Dataset.id == auth_code.dataset_id))
-    dataset = dataset_res.scalar_one_or_none()
-    dataset_source_file = dataset.source_file if dataset else None
-
     return AuthCodeVerifyResponse(
         valid=True,
-        dataset_id=auth_code.dataset_id,
+        dataset_id=snapshot["dataset_id"],
         dataset_source_file=dataset_source_file,
-        item_start=auth_code.item_start,
-        item_end=auth_code.item_end,
-        item_ids=auth_code.item_ids,
-        permission=auth_code.permission,
+        item_start=snapshot["item_start"],
+        item_end=snapshot["item_end"],
+        item_ids=snapshot["item_ids"],
+        permission=snapshot["permission"],
         session_token=session_token,
     )
 
@@ -179,6 +292,7 @@ async def revoke_auth_code(
 
     auth_code.is_active = False
     await db.commit()
+    await cache_delete(auth_code_cache_key(auth_code.code))
 
     return {"message": "授权码已撤销"}
 
@@ -206,24 +320,36 @@ async def leave_session(
     if not session_token:
         return {"message": "no session_token provided"}
 
+    # 标记会话已离开 (条件 UPDATE 保证同一会话只释放一次名额)
     result = await db.execute(
-        select(AuthCodeSession).where(AuthCodeSession.session_token == session_token)
+        update(AuthCodeSession)
+        .where(
+            AuthCodeSession.session_token == session_token,
+            AuthCodeSession.is_left.isnot(True),
+        )
+        .values(is_left=True)
+        .returning(AuthCodeSession.auth_code_id)
     )
-    session = result.scalar_one_or_none()
-
-    if not session:
-        return {"message": "会话不存在"}
-
-    if session.is_left:
+    auth_code_id = result.scalar_one_or_none()
+    await invalidate_auth_session_cache(session_token)
+
+    if auth_code_id is None:
+        existing = await db.execute(
+            select(AuthCodeSession.id).where(
+                AuthCodeSession.session_token == session_token
+            )
+        )
+        if existing.scalar_one_or_none() is None:
+            return {"message": "会话不存在"}
         return {"message": "会话已离开"}
 
-    # 标记会话已离开
-    session.is_left = True
-
-    # 减少在线计数
-    auth_code = await db.get(AuthCode, session.auth_code_id)
-    if auth_code and auth_code.current_online > 0:
-        auth_code.current_online -= 1
+    # 减少在线计数 (Redis 不可用或计数键不存在时直接扣减数据库)
+    if not await release_online_slot(auth_code_id):
+        await db.execute(
+            update(AuthCode)
+            .where(AuthCode.id == auth_code_id, AuthCode.current_online > 0)
+            .values(current_online=AuthCode.current_online - 1)
+        )
 
     await db.commit()
 
@@ -239,28 +365,26 @@ async def record_review(
     db: AsyncSession = Depends(get_db),
 ):
     """记录授权审核操作"""
-    result = await db.execute(select(AuthCode).where(AuthCode.code == code))
-    auth_code = result.scalar_one_or_none()
+    result = await db.execute(_AUTH_CODE_ID_BY_CODE, {"code": code})
+    auth_code_id = result.scalar_one_or_none()
 
-    if not auth_code:
+    if auth_code_id is None:
         raise HTTPException(status_code=404, detail="授权码不存在")
 
-    # 检查是否已记录
-    existing = await db.execute(
-        select(AuthCodeReviewedItem).where(
-            AuthCodeReviewedItem.auth_code_id == auth_code.id,
-            AuthCodeReviewedItem.item_id == item_id,
+    # 已记录过则唯一索引冲突，不插入也不返回行
+    result = await db.execute(
+        pg_insert(AuthCodeReviewedItem)
+        .values(auth_code_id=auth_code_id, item_id=item_id, action=action)
+        .on_conflict_do_nothing(
+            index_elements=[
+                AuthCodeReviewedItem.auth_code_id,
+                AuthCodeReviewedItem.item_id,
+            ]
         )
+        .returning(AuthCodeReviewedItem.id)
     )
-    if existing.scalar_one_or_none():
+    if result.scalar_one_or_none() is None:
         return {"message": "已记录"}
-
-    reviewed = AuthCodeReviewedItem(
-        auth_code_id=auth_code.id,
-        item_id=item_id,
-        action=action,
-    )
-    db.add(reviewed)
     await db.commit()
 
     return {"message": "记录成功"}
@@ -269,26 +393,35 @@ async def record_review(
 @router.get("/{code}/reviewed")
 async def get_reviewed_items(
     code: str,
+    page: int = Query(1, ge=1),
+    page_size: int = Query(50, ge=1, le=500),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
     """获取授权码的审核记录"""
     result = await db.execute(
-        select(AuthCode).where(
-            AuthCode.code == code,
-            AuthCode.creator_id == current_user.id,
-        )
+        _AUTH_CODE_ID_BY_CODE_AND_CREATOR,
+        {"code": code, "creator_id": current_user.id},
     )
-    auth_code = result.scalar_one_or_none()
+    auth_code_id = result.scalar_one_or_none()
 
-    if not auth_code:
+    if auth_code_id is None:
         raise HTTPException(status_code=404, detail="授权码不存在")
 
+    # 分页并只取列表展示需要的列
     result = await db.execute(
-        select(AuthCodeReviewedItem)
-        .where(AuthCodeReviewedItem.auth_code_id == auth_code.id)
-        .order_by(AuthCodeReviewedItem.created_at.desc())
+        select(
+            AuthCodeReviewedItem.id,
+            AuthCodeReviewedItem.item_id,
+            AuthCodeReviewedItem.action,
+            AuthCodeReviewedItem.created_at,
+        )
+        .where(AuthCodeReviewedItem.auth_code_id == auth_code_id)
+        .order_by(
+            AuthCodeReviewedItem.created_at.desc(), AuthCodeReviewedItem.id.desc()
+        )
+        .limit(page_size)
+        .offset((page - 1) * page_size)
     )
-    items = result.scalars().all()
 
-    return items
+    return [dict(row) for row in result.mappings()]
@@ -1,11 +1,15 @@
 import csv
 import io
-import json
+import itertools
 import os
+import shutil
+import threading
 import uuid
 import zipfile
-from typing import Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import AbstractSet, Dict, List, Optional
 
+import orjson
 from fastapi import (
     APIRouter,
     BackgroundTasks,
@@ -16,19 +20,27 @@ from fastapi import (
     UploadFile,
     status,
 )
-from sqlalchemy import and_, func, select, update
+from pydantic import TypeAdapter
+from sqlalchemy import and_, delete, func, insert, or_, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import joinedload
 
+from app.api.auth_codes import auth_code_cache_key
 from app.api.deps import get_current_user, require_admin
+from app.api.folders import invalidate_folder_tree_cache
+from app.core.cache import cache_delete
 from app.core.config import settings
 from app.core.database import AsyncSessionLocal, get_db
 from app.core.dedup_config import DedupConfigManager
 from app.core.global_config import get_dedup_defaults, set_dedup_defaults
+from app.models.auth_code import AuthCode, AuthCodeReviewedItem, AuthCodeSession
 from app.models.data_item import DataItem, ItemStatus, ItemType
 from app.models.dataset import Dataset, DatasetFormat, DatasetStatus
 from app.models.folder import Folder
 from app.models.import_history import ImportHistory, ImportOperationType, ImportStatus
+from app.models.reference_doc import ReferenceDoc
+from app.models.revision import Revision
+from app.models.share_link import ShareLink
 from app.models.task import Task, TaskStatus
 from app.models.user import User, UserRole
 from app.schemas.dataset import (
@@ -58,129 +70,315 @@ def detect_fields_from_content(items: List[dict]) -> tuple[List[str], FieldMappi
 
     # 使用改进的字段检测工具扫描所有字段（不仅是前10条）
     all_fields = FieldDetectionUtils.scan_all_fields(items)
-    detected_fields = sorted(list(all_fields))
-
-    # 生成建议映射
-    suggested = FieldMapping(detected_fields=detected_fields)
-
-    # 检测问题字段
-    for key in FieldDetectionUtils.QUESTION_FIELD_KEYS:
-        if key in all_fields:
-            suggested.question_field = key
-            break
-
-    # 检测回答字段
-    for key in FieldDetectionUtils.ANSWER_FIELD_KEYS:
-        if key in all_fields:
-            suggested.answer_field = key
-            break
-
-    # 检测思考字段
-    for key in FieldDetectionUtils.THINKING_FIELD_KEYS:
-        if key in all_fields:
-            suggested.thinking_field = key
-            break
-
-    # 检测上下文字段
-    for key in FieldDetectionUtils.CONTEXT_FIELD_KEYS:
-        if key in all_fields:
-            suggested.context_field = key
-            break
-
-    # 检测消息字段
-    for key in FieldDetectionUtils.MESSAGES_FIELD_KEYS:
-        if key in all_fields:
-            suggested.messages_field = key
-            suggested.display_mode = DisplayMode.CONVERSATION
-            break
-
-    # 检测图片字段
-    for key in FieldDetectionUtils.IMAGE_FIELD_KEYS:
-        if key in all_fields:
-            suggested.image_field = key
-            break
+    return build_field_mapping(all_fields)
+
+
+def build_field_mapping(all_fields: set) -> tuple[List[str], FieldMapping]:
+    """根据所有出现过的字段生成建议映射"""
+    if not all_fields:
+        return [], FieldMapping()
+
+    detected_fields = sorted(all_fields)
+
+    # 各类字段按优先级取第一个出现的候选键
+    question_field = _first_present(FieldDetectionUtils.QUESTION_FIELD_KEYS, all_fields)
+    answer_field = _first_present(FieldDetectionUtils.ANSWER_FIELD_KEYS, all_fields)
+    thinking_field = _first_present(FieldDetectionUtils.THINKING_FIELD_KEYS, all_fields)
+    context_field = _first_present(FieldDetectionUtils.CONTEXT_FIELD_KEYS, all_fields)
+    messages_field = _first_present(FieldDetectionUtils.MESSAGES_FIELD_KEYS, all_fields)
+    image_field = _first_present(FieldDetectionUtils.IMAGE_FIELD_KEYS, all_fields)
 
     # 确定显示模式
-    if suggested.messages_field:
-        suggested.display_mode = DisplayMode.CONVERSATION
-    elif suggested.question_field and suggested.answer_field:
-        suggested.display_mode = DisplayMode.QA_PAIR
+    if messages_field:
+        display_mode = DisplayMode.CONVERSATION
+    elif question_field and answer_field:
+        display_mode = DisplayMode.QA_PAIR
     else:
-        suggested.display_mode = DisplayMode.PLAIN
+        display_mode = DisplayMode.PLAIN
 
     # 剩余字段作为元数据
     mapped_fields = {
-        suggested.question_field,
-        suggested.answer_field,
-        suggested.thinking_field,
-        suggested.context_field,
-        suggested.messages_field,
+        question_field,
+        answer_field,
+        thinking_field,
+        context_field,
+        messages_field,
     }
-    suggested.metadata_fields = [
-        f for f in detected_fields if f not in mapped_fields and f is not None
-    ]
+    metadata_fields = [f for f in detected_fields if f not in mapped_fields]
+
+    suggested = FieldMapping(
+        question_field=question_field,
+        answer_field=answer_field,
+        thinking_field=thinking_field,
+        context_field=context_field,
+        messages_field=messages_field,
+        image_field=image_field,
+        metadata_fields=metadata_fields,
+        display_mode=display_mode,
+        detected_fields=detected_fields,
+    )
 
     return detected_fields, suggested
 
 
+# 语料类型检测的候选键 (按优先级排列)
+QA_KEY_PAIRS = (
+    ("instruction", "output"),
+    ("question", "answer"),
+    ("prompt", "completion"),
+    ("input", "output"),
+)
+MESSAGES_KEYS = ("messages", "conversations")
+QUESTION_KEYS = ("instruction", "question", "prompt", "input")
+ANSWER_KEYS = ("output", "answer", "completion", "response")
+PLAIN_TEXT_KEYS = ("text", "content", "sentence", "data")
+
+_MESSAGES_KEY_SET = frozenset(MESSAGES_KEYS)
+_ITEM_TYPE_KEY_SET = (
+    frozenset(k for pair in QA_KEY_PAIRS for k in pair) | _MESSAGES_KEY_SET
+)
+_NORMALIZE_KEY_SET = (
+    frozenset(QUESTION_KEYS + ANSWER_KEYS + PLAIN_TEXT_KEYS) | _MESSAGES_KEY_SET
+)
+
+
+# 列表条目整体一次校验, 复用编译好的核心 schema
+_DATASET_LIST_ADAPTER = TypeAdapter(List[DatasetResponse])
+
+# 文件扩展名 -> 数据格式
+FILE_FORMAT_MAP = {
+    "jsonl": DatasetFormat.JSONL,
+    "json": DatasetFormat.JSON,
+    "csv": DatasetFormat.CSV,
+    "tsv": DatasetFormat.TSV,
+}
+
+
+# 后台导入每批写入的条数, 以及读取线程与写库协程之间最多缓冲的批数
+IMPORT_BATCH_SIZE = 5000
+IMPORT_QUEUE_SIZE = 4
+
+# ZIP 并行解压的最大线程数
+ZIP_EXTRACT_MAX_WORKERS = 8
+
+# 可选依赖: SIMD 加速的 zlib, 仅用于导入时解压 ZIP
+try:
+    from zlib_ng import zlib_ng
+except ImportError:
+    zlib_ng = None
+
+# 上传文件落盘的分块大小
+UPLOAD_CHUNK_SIZE = 1024 * 1024 * 4  # 4MB, 足以跑满磁盘带宽, 并发上传时每个只占一块缓冲
+
+# 上传前预览 CSV/TSV 时构建为 dict 的样本行数（字段由表头决定，其余行只计数）
+CSV_DETECT_SAMPLE_ROWS = 100
+
+
+async def save_upload_file(file: UploadFile, file_path: str) -> int:
+    """把上传文件分块写入磁盘 (在线程中执行), 返回写入的字节数"""
+    import asyncio
+
+    def copy_to_disk():
+        file.file.seek(0)
+        with open(file_path, "wb") as buffer:
+            shutil.copyfileobj(file.file, buffer, UPLOAD_CHUNK_SIZE)
+            return buffer.tell()
+
+    return await asyncio.to_thread(copy_to_disk)
+
+
+def find_zip_data_member(names: List[str]) -> Optional[tuple[str, DatasetFormat]]:
+    """在 ZIP 成员列表中选出要导入的数据文件 (优先 .jsonl, 其次 .json)"""
+    json_member = None
+    for name in names:
+        lower_name = name.lower()
+        if lower_name.endswith(".jsonl"):
+            return name, DatasetFormat.JSONL
+        if (
+            json_member is None
+            and lower_name.endswith(".json")
+            and not lower_name.endswith("package.json")
+        ):
+            json_member = name
+    if json_member is not None:
+        return json_member, DatasetFormat.JSON
+    return None
+
+
+class ImportZipFile(zipfile.ZipFile):
+    """数据集导入用的 ZipFile: 安装了 zlib-ng 时用它解压 deflate 成员
+
+    只替换本类打开的成员的解压器, 批量导出等其他 zipfile 用法仍走标准库 zlib;
+    用 zlib-ng 解压时, 损坏数据抛出的是 zlib_ng.error。
+    """
+
+    def open(self, name, mode="r", pwd=None, *, force_zip64=False):
+        member = super().open(name, mode, pwd, force_zip64=force_zip64)
+        if (
+            zlib_ng is not None
+            and mode == "r"
+            and member._compress_type == zipfile.ZIP_DEFLATED
+        ):
+            # 尚未读取任何数据, 直接换成接口兼容的 zlib-ng 解压器
+            member._decompressor = zlib_ng.decompressobj(-15)
+        return member
+
+
+def extract_zip_parallel(
+    file_path: str, extract_dir: str, names: Optional[List[str]] = None
+) -> Dict[str, str]:
+    """多线程解压 ZIP (zlib 解压时释放 GIL, 多个成员可并行解压)
+
+    成员按轮询分给各线程, 每个线程使用独立的 ZipFile 句柄;
+    路径清理等沿用 ZipFile.extract 的处理。返回 {成员名: 解压后的路径}。
+    """
+    if names is None:
+        with ImportZipFile(file_path, "r") as zip_ref:
+            names = zip_ref.namelist()
+
+    def extract_members(member_names):
+        paths = {}
+        with ImportZipFile(file_path, "r") as zip_ref:
+            for name in member_names:
+                try:
+                    paths[name] = zip_ref.extract(name, extract_dir)
+                except FileExistsError:
+                    # 其他线程同时创建了同一父目录, 重试即可
+                    paths[name] = zip_ref.extract(name, extract_dir)
+        return paths
+
+    workers = min(len(names), os.cpu_count() or 1, ZIP_EXTRACT_MAX_WORKERS)
+    if workers <= 1:
+        return extract_members(names)
+
+    extracted = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(extract_members, names[i::workers]) for i in range(workers)
+        ]
+        for future in futures:
+            extracted.update(future.result())
+    return extracted
+
+
+def zip_member_path(extract_dir: str, name: str) -> str:
+    """ZIP 成员解压后的路径 (与 ZipFile.extract 一样去掉 ''/'.'/'..' 路径段)"""
+    parts = [p for p in name.split("/") if p not in ("", os.curdir, os.pardir)]
+    return os.path.normpath(os.path.join(extract_dir, *parts))
+
+
+def iter_data_items(f, format_type: DatasetFormat):
+    """从二进制文件对象逐条读取 JSONL/JSON 数据 (同步生成器, 在线程中使用)
+
+    JSONL 按行流式解析; JSON 需整体解析后再逐条产出。
+    orjson 直接解析 bytes, 省去 UTF-8 解码拷贝。
+    """
+    if format_type == DatasetFormat.JSONL:
+        for line in f:
+            if line.strip():
+                yield orjson.loads(line)
+    elif format_type == DatasetFormat.JSON:
+        data = orjson.loads(f.read())
+        if isinstance(data, list):
+            yield from data
+        else:
+            yield data
+
+
+def iter_data_file_items(
+    file_path: str, format_type: DatasetFormat, zip_member: Optional[str] = None
+):
+    """逐条读取数据文件; 指定 zip_member 时直接从 ZIP 中流式解压读取该成员"""
+    if zip_member is None:
+        with open(file_path, "rb") as f:
+            yield from iter_data_items(f, format_type)
+        return
+    with ImportZipFile(file_path, "r") as zip_ref, zip_ref.open(zip_member) as f:
+        yield from iter_data_items(f, format_type)
+
+
+def get_file_ext(filename: str) -> str:
+    """获取小写的文件扩展名 (不含点)"""
+    return filename.rsplit(".", 1)[-1].lower()
+
+
+def _first_present(candidates: tuple, present: AbstractSet[str]) -> Optional[str]:
+    """按优先级返回第一个出现在 present 中的键"""
+    for key in candidates:
+        if key in present:
+            return key
+    return None
+
+
 def detect_item_type(content: dict) -> ItemType:
     """检测语料类型"""
-    # QA类型检测
-    qa_patterns = [
-        ("instruction", "output"),
-        ("question", "answer"),
-        ("prompt", "completion"),
-        ("input", "output"),
-    ]
-    for q_key, a_key in qa_patterns:
-        if q_key in content and a_key in content:
-            return ItemType.QA
+    # 一次集合求交得到所有相关键, 后续只在这个小集合上判断
+    present = _ITEM_TYPE_KEY_SET.intersection(content)
+    if not present:
+        return ItemType.PLAIN
 
     # messages格式 (OpenAI/ShareGPT)
-    if "messages" in content or "conversations" in content:
+    if not _MESSAGES_KEY_SET.isdisjoint(present):
         return ItemType.QA
 
+    # QA类型检测
+    for q_key, a_key in QA_KEY_PAIRS:
+        if q_key in present and a_key in present:
+            return ItemType.QA
+
     return ItemType.PLAIN
 
 
+class ItemTypeCache:
+    """按顶层键组合缓存 detect_item_type 的结果
+
+    语料类型只取决于顶层键, 同一数据集的条目通常键完全相同, 批量导入时可以直接命中。
+    以键元组为缓存键 (比 frozenset 构造更快), 键顺序不同只会多一个缓存项。
+    """
+
+    MAX_ENTRIES = 1024
+
+    def __init__(self):
+        self._cache: Dict[tuple, ItemType] = {}
+
+    def detect(self, content: dict) -> ItemType:
+        if not isinstance(content, dict):
+            return detect_item_type(content)
+        keys = tuple(content)
+        item_type = self._cache.get(keys)
+        if item_type is None:
+            item_type = detect_item_type(content)
+            if len(self._cache) < self.MAX_ENTRIES:
+                self._cache[keys] = item_type
+        return item_type
+
+
 def normalize_content(content: dict, item_type: ItemType) -> dict:
     """标准化内容格式"""
+    present = _NORMALIZE_KEY_SET.intersection(content)
+
     if item_type == ItemType.PLAIN:
         # 尝试提取文本字段
-        for key in ["text", "content", "sentence", "data"]:
-            if key in content:
-                return {"text": content[key]}
+        key = _first_present(PLAIN_TEXT_KEYS, present)
+        if key is not None:
+            return {"text": content[key]}
         # 如果没有标准字段,保留原始
         return content
 
     # QA类型标准化
-    if "messages" in content:
-        return {"messages": content["messages"]}
-    if "conversations" in content:
-        return {"messages": content["conversations"]}
+    key = _first_present(MESSAGES_KEYS, present)
+    if key is not None:
+        return {"messages": content[key]}
 
     # 提取QA对
-    q_keys = ["instruction", "question", "prompt", "input"]
-    a_keys = ["output", "answer", "completion", "response"]
-
-    question = None
-    answer = None
-
-    for key in q_keys:
-        if key in content:
-            question = content[key]
-            break
+    q_key = _first_present(QUESTION_KEYS, present)
+    a_key = _first_present(ANSWER_KEYS, present)
 
-    for key in a_keys:
-        if key in content:
-            answer = content[key]
-            break
-
-    if question is not None and answer is not None:
+    if q_key is not None and a_key is not None:
         return {
             "messages": [
-                {"role": "user", "content": question},
-                {"role": "assistant", "content": answer},
+                {"role": "user", "content": content[q_key]},
+                {"role": "assistant", "content": content[a_key]},
             ]
         }
 
@@ -200,20 +398,14 @@ async def upload_dataset(
 ):
     """上传并导入数据集 (异步处理)"""
     # 检测文件格式
-    filename = file.filename.lower()
-    is_zip = filename.endswith(".zip")
+    ext = get_file_ext(file.filename)
+    is_zip = ext == "zip"
 
     if is_zip:
         format_type = DatasetFormat.JSONL  # 默认先占位,稍后通过内容确认
-    elif filename.endswith(".jsonl"):
-        format_type = DatasetFormat.JSONL
-    elif filename.endswith(".json"):
-        format_type = DatasetFormat.JSON
-    elif filename.endswith(".csv"):
-        format_type = DatasetFormat.CSV
-    elif filename.endswith(".tsv"):
-        format_type = DatasetFormat.TSV
     else:
+        format_type = FILE_FORMAT_MAP.get(ext)
+    if format_type is None:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="不支持的文件格式,请上传 JSONL, JSON, CSV, TSV 或 ZIP 文件",
@@ -226,13 +418,8 @@ async def upload_dataset(
 
     file_path = os.path.join(save_dir, file.filename)
 
-    # 使用 chunk 写入, 避免内存溢出
-    with open(file_path, "wb") as buffer:
-        while True:
-            chunk = await file.read(1024 * 1024 * 10)  # 10MB chunks
-            if not chunk:
-                break
-            buffer.write(chunk)
+    # 分块写入, 避免内存溢出; 磁盘 IO 不占用事件循环
+    file_size = await save_upload_file(file, file_path)
 
     # 简单设置 initial source_file, 后台任务会更新为解压后的文件路径
     relative_path = os.path.relpath(file_path, settings.UPLOAD_DIR).replace("\\", "/")
@@ -247,21 +434,19 @@ async def upload_dataset(
         status=DatasetStatus.IMPORTING,
     )
     db.add(dataset)
-    await db.commit()
-    await db.refresh(dataset)
+    await db.flush()  # 获取自增主键, 服务端默认值由 INSERT ... RETURNING 带回
 
     # 创建导入历史记录
     import_history = ImportHistory(
         dataset_id=dataset.id,
         operation_type=ImportOperationType.UPLOAD,
         filename=file.filename,
-        file_size=os.path.getsize(file_path) if os.path.exists(file_path) else 0,
+        file_size=file_size,
         status=ImportStatus.IMPORTING,
         created_by=current_user.id,
     )
     db.add(import_history)
     await db.commit()
-    await db.refresh(import_history)
 
     # 添加后台任务
     background_tasks.add_task(
@@ -305,98 +490,116 @@ async def process_dataset_import(
 
             # 2. 如果是zip,解压并寻找数据文件
             data_file_path = file_path
+            data_member = None
             save_dir = os.path.dirname(file_path)
 
             if is_zip:
                 extract_dir = save_dir
 
                 def unzip_file():
-                    with zipfile.ZipFile(file_path, "r") as zip_ref:
-                        zip_ref.extractall(extract_dir)
-
-                await asyncio.to_thread(unzip_file)
-
-                # 寻找数据文件
-                found = False
-                for root, dirs, files in os.walk(extract_dir):
-                    for f in files:
-                        if f.endswith(".jsonl"):
-                            data_file_path = os.path.join(root, f)
-                            format_type = DatasetFormat.JSONL
-                            found = True
-                            break
-                        elif f.endswith(".json") and not f.endswith("package.json"):
-                            data_file_path = os.path.join(root, f)
-                            format_type = DatasetFormat.JSON
-                            found = True
-                            break
-                    if found:
-                        break
-
-                if not found:
-                    raise Exception("ZIP包中未找到支持的数据文件(.jsonl/.json)")
-
-            # 更新 source_file (存储相对路径)
+                    # 先从成员列表中确定数据文件, 找不到时不必解压
+                    with ImportZipFile(file_path, "r") as zip_ref:
+                        names = zip_ref.namelist()
+                    target = find_zip_data_member(names)
+                    if target is None:
+                        raise Exception("ZIP包中未找到支持的数据文件(.jsonl/.json)")
+                    # 其余成员 (如图片) 按数据文件所在目录的相对路径引用, 仍需解压;
+                    # 数据文件本身不落盘, 导入时直接从 ZIP 流式读取
+                    others = [name for name in names if name != target[0]]
+                    if others:
+                        extract_zip_parallel(file_path, extract_dir, others)
+                    return target
+
+                data_member, format_type = await asyncio.to_thread(unzip_file)
+                data_file_path = zip_member_path(extract_dir, data_member)
+
+            # 更新 source_file (存储相对路径; ZIP 时为数据文件在解压目录中的位置,
+            # 前端据此解析图片等相对路径)
             relative_path = os.path.relpath(
                 data_file_path, settings.UPLOAD_DIR
             ).replace("\\", "/")
             dataset.source_file = relative_path
             dataset.format = format_type
 
-            # 读取并解析文件内容
-            items = []
+            # 流水线导入: 线程中读取并解析文件, 按批放入有界队列;
+            # 协程侧取出批次写库, 读取/解析与写库重叠, 内存只保留少量批次
+            loop = asyncio.get_running_loop()
+            queue: asyncio.Queue = asyncio.Queue(maxsize=IMPORT_QUEUE_SIZE)
+            stop_event = threading.Event()
+
+            def put_batch(batch):
+                asyncio.run_coroutine_threadsafe(queue.put(batch), loop).result()
+
+            def produce():
+                try:
+                    batch = []
+                    items = iter_data_file_items(file_path, format_type, data_member)
+                    for item in items:
+                        if stop_event.is_set():
+                            return
+                        batch.append(normalize_json_keys(item))
+                        if len(batch) >= IMPORT_BATCH_SIZE:
+                            put_batch(batch)
+                            batch = []
+                    if batch:
+                        put_batch(batch)
+                finally:
+                    put_batch(None)  # 结束标记
+
+            producer = asyncio.create_task(asyncio.to_thread(produce))
 
-            def read_content():
-                read_items = []
-                with open(data_file_path, "r", encoding="utf-8") as f:
-                    if format_type == DatasetFormat.JSONL:
-                        for line in f:
-                            if line.strip():
-                                read_items.append(json.loads(line))
-                    elif format_type == DatasetFormat.JSON:
-                        data = json.load(f)
-                        if isinstance(data, list):
-                            read_items = data
-                        else:
-                            read_items = [data]
-                return read_items
-
-            items = await asyncio.to_thread(read_content)
-
-            items = [normalize_json_keys(it) for it in items]
+            # 创建数据项
+            # 分批写入 (Core 批量 INSERT, 不经过 ORM 工作单元)
+            # 所有批次与最终状态更新在同一事务内提交, 失败时整体回滚, 不留半截数据
+            # current_content 不写入 (NULL 即未修改), 避免每条内容存两份
+            all_fields = set()
+            item_count = 0
+            item_types = ItemTypeCache()
+            try:
+                while True:
+                    batch = await queue.get()
+                    if batch is None:
+                        break
+                    rows = []
+                    for item_content in batch:
+                        item_count += 1
+                        if isinstance(item_content, dict):
+                            all_fields.update(item_content.keys())
+                        rows.append(
+                            {
+                                "dataset_id": dataset.id,
+                                "seq_num": item_count,
+                                "item_type": item_types.detect(item_content),
+                                "original_content": item_content,
+                                "status": ItemStatus.PENDING,
+                            }
+                        )
+                    await db.execute(insert(DataItem), rows)
+            except BaseException:
+                # 写库失败时通知读取线程退出, 并清空队列使其不再阻塞
+                stop_event.set()
+                while not producer.done():
+                    while not queue.empty():
+                        queue.get_nowait()
+                    await asyncio.sleep(0.01)
+                raise
+            # 读取线程中的异常 (如 JSON 解析失败) 在这里抛出
+            await producer
 
             # 检测字段并生成建议映射
-            detected_fields, suggested_mapping = detect_fields_from_content(items)
+            detected_fields, suggested_mapping = build_field_mapping(all_fields)
             dataset.field_mapping = suggested_mapping.model_dump()
 
-            # 创建数据项
-            # 分批写入
-            batch_size = 1000
-            for i in range(0, len(items), batch_size):
-                batch = items[i : i + batch_size]
-                for seq_offset, item_content in enumerate(batch):
-                    item_type = detect_item_type(item_content)
-                    data_item = DataItem(
-                        dataset_id=dataset.id,
-                        seq_num=i + seq_offset + 1,
-                        item_type=item_type,
-                        original_content=item_content,
-                        current_content=item_content,
-                        status=ItemStatus.PENDING,
-                    )
-                    db.add(data_item)
-                await db.commit()
-
             # 更新数据集状态
-            dataset.item_count = len(items)
+            dataset.item_count = item_count
             dataset.status = DatasetStatus.READY
 
             # 更新导入历史记录
             import_history.status = ImportStatus.COMPLETED
-            import_history.total_items = len(items)
-            import_history.imported_items = len(items)
+            import_history.total_items = item_count
+            import_history.imported_items = item_count
             import_history.start_seq = 1
-            import_history.end_seq = len(items)
+            import_history.end_seq = item_count
             import_history.completed_at = func.now()
 
             await db.commit()
@@ -517,16 +720,9 @@ async def list_datasets(
         except ValueError:
             pass
 
-    # 查询总数
-    count_query = select(func.count(Dataset.id))
-    if conditions:
-        count_query = count_query.where(*conditions)
-    count_result = await db.execute(count_query)
-    total = count_result.scalar()
-
-    # 查询数据
+    # 查询数据, 用窗口函数在同一条查询中带出总数
     query = (
-        select(Dataset)
+        select(Dataset, func.count().over().label("total"))
         .order_by(Dataset.created_at.desc())
         .offset(offset)
         .limit(page_size)
@@ -534,10 +730,25 @@ async def list_datasets(
     if conditions:
         query = query.where(*conditions)
     result = await db.execute(query)
-    datasets = result.scalars().all()
-
-    return DatasetListResponse(
-        items=datasets, total=total, page=page, page_size=page_size
+    rows = result.all()
+    datasets = [row[0] for row in rows]
+    if rows:
+        total = rows[0].total
+    elif offset == 0:
+        total = 0
+    else:
+        # 页码越界时没有行可带出总数, 单独统计
+        count_query = select(func.count(Dataset.id))
+        if conditions:
+            count_query = count_query.where(*conditions)
+        total = (await db.execute(count_query)).scalar()
+
+    # 条目已由 TypeAdapter 校验, 外层不再逐字段校验
+    return DatasetListResponse.model_construct(
+        items=_DATASET_LIST_ADAPTER.validate_python(datasets),
+        total=total,
+        page=page,
+        page_size=page_size,
     )
 
 
@@ -635,31 +846,25 @@ async def update_dataset(
     current_user: User = Depends(require_admin),
 ):
     """更新数据集配置（管理员）"""
-    result = await db.execute(select(Dataset).where(Dataset.id == dataset_id))
-    dataset = result.scalar_one_or_none()
-
-    if not dataset:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND, detail="数据集不存在"
-        )
-
-    # 更新字段
+    values = {}
     if update_data.name is not None:
-        dataset.name = update_data.name
+        values["name"] = update_data.name
     if update_data.description is not None:
-        dataset.description = update_data.description
+        values["description"] = update_data.description
     if update_data.field_mapping is not None:
-        dataset.field_mapping = update_data.field_mapping.model_dump()
+        values["field_mapping"] = update_data.field_mapping.model_dump()
     if update_data.review_config is not None:
-        dataset.review_config = update_data.review_config.model_dump()
+        values["review_config"] = update_data.review_config.model_dump()
     if update_data.dedup_config is not None:
-        dataset.dedup_config = update_data.dedup_config.model_dump()
+        values["dedup_config"] = update_data.dedup_config.model_dump()
     if update_data.status is not None:
-        dataset.status = update_data.status
+        values["status"] = update_data.status
     if update_data.owner_id is not None:
         # 检查新所有者是否存在且活跃
-        result = await db.execute(select(User).where(User.id == update_data.owner_id))
-        new_owner = result.scalar_one_or_none()
+        result = await db.execute(
+            select(User.is_active, User.role).where(User.id == update_data.owner_id)
+        )
+        new_owner = result.one_or_none()
         if not new_owner:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND, detail="新所有者不存在"
@@ -674,11 +879,26 @@ async def update_dataset(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="只能将所有权转移给管理员或超级管理员",
             )
-        dataset.owner_id = update_data.owner_id
+        values["owner_id"] = update_data.owner_id
+
+    if values:
+        # UPDATE ... RETURNING 一次往返完成更新并取回最新行, 无需先查询再 refresh
+        result = await db.execute(
+            update(Dataset)
+            .where(Dataset.id == dataset_id)
+            .values(**values)
+            .returning(Dataset)
+        )
+    else:
+        result = await db.execute(select(Dataset).where(Dataset.id == dataset_id))
+    dataset = result.scalar_one_or_none()
 
-    await db.commit()
-    await db.refresh(dataset)
+    if not dataset:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="数据集不存在"
+        )
 
+    await db.commit()
     return dataset
 
 
@@ -690,16 +910,16 @@ async def move_dataset(
     current_user: User = Depends(get_current_user),
 ):
     """移动数据集到指定目录"""
-    result = await db.execute(select(Dataset).where(Dataset.id == dataset_id))
-    dataset = result.scalar_one_or_none()
+    result = await db.execute(select(Dataset.owner_id).where(Dataset.id == dataset_id))
+    owner_id = result.scalar_one_or_none()
 
-    if not dataset:
+    if owner_id is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="数据集不存在"
         )
 
     # 检查权限：只有所有者或管理员可以移动
-    if dataset.owner_id != current_user.id and current_user.role not in [
+    if owner_id != current_user.id and current_user.role not in [
         UserRole.SUPER_ADMIN,
         UserRole.ADMIN,
     ]:
@@ -710,23 +930,74 @@ async def move_dataset(
     # 如果指定了目标目录，检查目录是否存在且属于当前用户
     if move_data.folder_id is not None:
         folder_result = await db.execute(
-            select(Folder)
+            select(Folder.id)
             .where(Folder.id == move_data.folder_id)
             .where(Folder.owner_id == current_user.id)
         )
-        folder = folder_result.scalar_one_or_none()
-        if not folder:
+        if folder_result.scalar_one_or_none() is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND, detail="目标目录不存在"
             )
 
-    dataset.folder_id = move_data.folder_id
+    result = await db.execute(
+        update(Dataset)
+        .where(Dataset.id == dataset_id)
+        .values(folder_id=move_data.folder_id)
+        .returning(Dataset)
+    )
+    dataset = result.scalar_one()
     await db.commit()
-    await db.refresh(dataset)
-
+    # 目录树中的数据集数量随之变化
+    invalidate_folder_tree_cache()
     return dataset
 
 
+async def purge_dataset(db: AsyncSession, dataset_id: int) -> List[str]:
+    """按集合批量删除数据集及其所有关联数据, 返回被删除的授权码
+
+    不走 ORM 级联 (会先加载全部子对象再逐行 DELETE), 大数据集删除只需几条语句。
+    """
+    item_ids = select(DataItem.id).where(DataItem.dataset_id == dataset_id)
+    auth_code_ids = select(AuthCode.id).where(AuthCode.dataset_id == dataset_id)
+    # 不同步会话中的对象, 避免为删除的行回查主键
+    no_sync = {"synchronize_session": False}
+
+    await db.execute(
+        delete(Revision).where(Revision.item_id.in_(item_ids)),
+        execution_options=no_sync,
+    )
+    await db.execute(
+        delete(AuthCodeReviewedItem).where(
+            or_(
+                AuthCodeReviewedItem.item_id.in_(item_ids),
+                AuthCodeReviewedItem.auth_code_id.in_(auth_code_ids),
+            )
+        ),
+        execution_options=no_sync,
+    )
+    await db.execute(
+        delete(AuthCodeSession).where(AuthCodeSession.auth_code_id.in_(auth_code_ids)),
+        execution_options=no_sync,
+    )
+    result = await db.execute(
+        delete(AuthCode)
+        .where(AuthCode.dataset_id == dataset_id)
+        .returning(AuthCode.code),
+        execution_options=no_sync,
+    )
+    auth_codes = list(result.scalars())
+
+    for model in (DataItem, Task, ReferenceDoc, ImportHistory, ShareLink):
+        await db.execute(
+            delete(model).where(model.dataset_id == dataset_id),
+            execution_options=no_sync,
+        )
+    await db.execute(
+        delete(Dataset).where(Dataset.id == dataset_id), execution_options=no_sync
+    )
+    return auth_codes
+
+
 @router.delete("/{dataset_id}")
 async def delete_dataset(
     dataset_id: int,
@@ -735,19 +1006,16 @@ async def delete_dataset(
     current_user: User = Depends(get_current_user),
 ):
     """删除数据集（仅限所有者或超级管理员）"""
-    result = await db.execute(select(Dataset).where(Dataset.id == dataset_id))
-    dataset = result.scalar_one_or_none()
+    result = await db.execute(select(Dataset.owner_id).where(Dataset.id == dataset_id))
+    owner_id = result.scalar_one_or_none()
 
-    if not dataset:
+    if owner_id is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="数据集不存在"
         )
 
     # 权限检查：只有所有者或超级管理员可以删除
-    if (
-        current_user.role != UserRole.SUPER_ADMIN
-        and dataset.owner_id != current_user.id
-    ):
+    if current_user.role != UserRole.SUPER_ADMIN and owner_id != current_user.id:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="只有数据集所有者或超级管理员可以删除数据集",
@@ -766,8 +1034,10 @@ async def delete_dataset(
             detail=f"该数据集还有 {active_tasks} 个未完成的任务，请先删除或完成任务后再删除数据集",
         )
 
-    await db.delete(dataset)
+    auth_codes = await purge_dataset(db, dataset_id)
     await db.commit()
+    await cache_delete(*(auth_code_cache_key(code) for code in auth_codes))
+    invalidate_folder_tree_cache()
 
     return {"message": "数据集已删除"}
 
@@ -874,20 +1144,18 @@ async def preview_dataset(
             status_code=status.HTTP_404_NOT_FOUND, detail="数据集不存在"
         )
 
-    # 获取前N条数据项
-    items_result = await db.execute(
-        select(DataItem)
+    # 获取前N条数据项（只取 original_content 列）
+    contents_result = await db.execute(
+        select(DataItem.original_content)
         .where(DataItem.dataset_id == dataset_id)
         .order_by(DataItem.seq_num)
         .limit(count)
     )
-    items = items_result.scalars().all()
 
     # 收集所有字段
     all_fields = set()
     sample_data = []
-    for item in items:
-        content = item.original_content
+    for content in contents_result.scalars():
         if isinstance(content, dict):
             all_fields.update(content.keys())
             sample_data.append(content)
@@ -902,6 +1170,102 @@ async def preview_dataset(
     }
 
 
+def parse_upload_file(fileobj, filename: str):
+    """解析上传文件 (同步, 在线程中执行以免阻塞事件循环)
+
+    返回 (items, all_items_by_file, warnings, format_analysis, item_count)
+    CSV/TSV 只返回前 CSV_DETECT_SAMPLE_ROWS 行作为 items, item_count 为总行数
+    """
+    ext = get_file_ext(filename)
+    format_type = FILE_FORMAT_MAP.get(ext)
+    items = []
+    all_items_by_file = {}
+    format_analysis = None
+    warnings = []
+    item_count = None
+
+    fileobj.seek(0)
+    if format_type == DatasetFormat.JSONL:
+        # 逐行流式解析，避免整体 decode + split 产生的额外拷贝
+        for line in fileobj:  # 扫描所有行
+            if line.strip():
+                items.append(orjson.loads(line))
+        all_items_by_file[filename] = items
+
+    elif format_type == DatasetFormat.JSON:
+        data = orjson.loads(fileobj.read())
+        if isinstance(data, list):
+            items = data
+        else:
+            items = [data]
+        all_items_by_file[filename] = items
+
+    elif ext == "zip":
+        # 找到所有支持的数据文件
+        with ImportZipFile(fileobj, "r") as z:
+            data_files = []
+            for name in z.namelist():
+                lower_name = name.lower()
+                if lower_name.endswith(".jsonl") or lower_name.endswith(".json"):
+                    data_files.append(name)
+
+            if not data_files:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="ZIP包中未找到支持的数据文件(.jsonl/.json)",
+                )
+
+            # 分析所有数据文件
+            for data_file in data_files:
+                file_items = []
+                if data_file.lower().endswith(".jsonl"):
+                    with z.open(data_file) as f:
+                        for line in f:  # 扫描所有行
+                            if line.strip():
+                                file_items.append(orjson.loads(line))
+                elif data_file.lower().endswith(".json"):
+                    with z.open(data_file) as f:
+                        data = orjson.loads(f.read())
+                        if isinstance(data, list):
+                            file_items = data
+                        else:
+                            file_items = [data]
+
+                all_items_by_file[data_file] = file_items
+                items.extend(file_items)
+
+            # 如果有多个文件，检测格式冲突
+            if len(data_files) > 1:
+                warnings.append(f"检测到 {len(data_files)} 个数据文件")
+                format_analysis = FieldDetectionUtils.analyze_multifile_format(
+                    all_items_by_file
+                )
+                if not format_analysis["is_consistent"]:
+                    warnings.extend(format_analysis["conflicts"])
+
+    elif format_type in (DatasetFormat.CSV, DatasetFormat.TSV):
+        delimiter = "," if format_type == DatasetFormat.CSV else "\t"
+        # 直接在上传文件的底层文件对象上流式解码，避免整体 decode 的额外拷贝
+        text_stream = io.TextIOWrapper(fileobj, encoding="utf-8", newline="")
+        try:
+            reader = csv.DictReader(text_stream, delimiter=delimiter)
+            items = list(itertools.islice(reader, CSV_DETECT_SAMPLE_ROWS))
+            # 剩余行用底层 csv.reader 计数, 不再构建 dict（与 DictReader 一样跳过空行）
+            item_count = len(items) + sum(1 for row in reader.reader if row)
+        finally:
+            # 解除包装，避免 wrapper 回收时关闭 UploadFile 的底层文件
+            text_stream.detach()
+        all_items_by_file[filename] = items
+    else:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="不支持的文件格式"
+        )
+
+    if item_count is None:
+        item_count = len(items)
+    return items, all_items_by_file, warnings, format_analysis, item_count
+
+
 @router.post("/detect-fields", response_model=FieldDetectionResponse)
 async def detect_fields_from_file(
     file: UploadFile = File(...), current_user: User = Depends(get_current_user)
@@ -914,88 +1278,23 @@ async def detect_fields_from_file(
     3. 检测格式冲突和字段一致性问题
     4. 返回详细的字段和格式信息
     """
+    import asyncio
+
     # 检测文件格式
     filename = file.filename.lower()
-    content = await file.read()
-    items = []
-    all_items_by_file = {}
-    format_analysis = None
     consistency_check = None
-    warnings = []
 
     try:
-        if filename.endswith(".jsonl"):
-            lines = content.decode("utf-8").strip().split("\n")
-            for line in lines:  # 扫描所有行
-                if line.strip():
-                    items.append(json.loads(line))
-            all_items_by_file[filename] = items
-
-        elif filename.endswith(".json"):
-            data = json.loads(content.decode("utf-8"))
-            if isinstance(data, list):
-                items = data
-            else:
-                items = [data]
-            all_items_by_file[filename] = items
-
-        elif filename.endswith(".zip"):
-            # 找到所有支持的数据文件
-            with zipfile.ZipFile(io.BytesIO(content), "r") as z:
-                data_files = []
-                for name in z.namelist():
-                    lower_name = name.lower()
-                    if lower_name.endswith(".jsonl") or lower_name.endswith(".json"):
-                        data_files.append(name)
-
-                if not data_files:
-                    raise HTTPException(
-                        status_code=status.HTTP_400_BAD_REQUEST,
-                        detail="ZIP包中未找到支持的数据文件(.jsonl/.json)",
-                    )
-
-                # 分析所有数据文件
-                for data_file in data_files:
-                    file_items = []
-                    if data_file.lower().endswith(".jsonl"):
-                        with z.open(data_file) as f:
-                            lines = f.read().decode("utf-8").strip().split("\n")
-                            for line in lines:  # 扫描所有行
-                                if line.strip():
-                                    file_items.append(json.loads(line))
-                    elif data_file.lower().endswith(".json"):
-                        with z.open(data_file) as f:
-                            data = json.loads(f.read().decode("utf-8"))
-                            if isinstance(data, list):
-                                file_items = data
-                            else:
-                                file_items = [data]
-
-                    all_items_by_file[data_file] = file_items
-                    items.extend(file_items)
-
-                # 如果有多个文件，检测格式冲突
-                if len(data_files) > 1:
-                    warnings.append(f"检测到 {len(data_files)} 个数据文件")
-                    format_analysis = FieldDetectionUtils.analyze_multifile_format(
-                        all_items_by_file
-                    )
-                    if not format_analysis["is_consistent"]:
-                        warnings.extend(format_analysis["conflicts"])
-
-        elif filename.endswith(".csv") or filename.endswith(".tsv"):
-            delimiter = "," if filename.endswith(".csv") else "\t"
-            text_content = content.decode("utf-8")
-            reader = csv.DictReader(io.StringIO(text_content), delimiter=delimiter)
-            for row in reader:
-                items.append(dict(row))
-            all_items_by_file[filename] = items
-        else:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST, detail="不支持的文件格式"
-            )
-
-    except json.JSONDecodeError as e:
+        # 解析在线程中进行, 大文件解析期间不阻塞其他请求
+        (
+            items,
+            all_items_by_file,
+            warnings,
+            format_analysis,
+            item_count,
+        ) = await asyncio.to_thread(parse_upload_file, file.file, filename)
+
+    except orjson.JSONDecodeError as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, detail=f"JSON解析失败: {str(e)}"
         )
@@ -1035,7 +1334,7 @@ async def detect_fields_from_file(
         detected_fields=detected_fields,
         sample_data=items[:3],
         suggested_mapping=suggested_mapping,
-        item_count_estimate=len(items),
+        item_count_estimate=item_count,
         warnings=warnings if warnings else None,
         format_info=format_info,
         field_coverage=(
@@ -1069,16 +1368,8 @@ async def append_dataset(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="数据集正在导入中，请等待完成后再追加",
         )
-    filename = file.filename.lower()
-    if filename.endswith(".jsonl"):
-        format_type = DatasetFormat.JSONL
-    elif filename.endswith(".json"):
-        format_type = DatasetFormat.JSON
-    elif filename.endswith(".csv"):
-        format_type = DatasetFormat.CSV
-    elif filename.endswith(".tsv"):
-        format_type = DatasetFormat.TSV
-    else:
+    format_type = FILE_FORMAT_MAP.get(get_file_ext(file.filename))
+    if format_type is None:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="不支持的文件格式，请上传 JSONL, JSON, CSV 或 TSV 文件",
@@ -1090,19 +1381,14 @@ async def append_dataset(
     os.makedirs(save_dir, exist_ok=True)
     file_path = os.path.join(save_dir, file.filename)
 
-    with open(file_path, "wb") as buffer:
-        while True:
-            chunk = await file.read(1024 * 1024 * 10)
-            if not chunk:
-                break
-            buffer.write(chunk)
+    file_size = await save_upload_file(file, file_path)
 
     # 创建导入历史记录
     import_history = ImportHistory(
         dataset_id=dataset_id,
         operation_type=ImportOperationType.APPEND,
         filename=file.filename,
-        file_size=os.path.getsize(file_path) if os.path.exists(file_path) else 0,
+        file_size=file_size,
         status=ImportStatus.IMPORTING,
         skip_duplicates=skip_duplicates,
         dedup_config_snapshot=dataset.dedup_config,
@@ -1150,26 +1436,30 @@ async def process_dataset_append(
             # 读取并解析文件
             def read_content():
                 read_items = []
-                with open(file_path, "r", encoding="utf-8") as f:
+                if format_type in (DatasetFormat.CSV, DatasetFormat.TSV):
+                    delimiter = "," if format_type == DatasetFormat.CSV else "\t"
+                    with open(file_path, "r", encoding="utf-8") as f:
+                        reader = csv.DictReader(f, delimiter=delimiter)
+                        for row in reader:
+                            read_items.append(normalize_json_keys(row))
+                    return read_items
+
+                # JSON 以二进制读取, orjson 直接解析 bytes
+                with open(file_path, "rb") as f:
                     if format_type == DatasetFormat.JSONL:
                         for line in f:
                             if line.strip():
-                                read_items.append(json.loads(line))
+                                read_items.append(orjson.loads(line))
                     elif format_type == DatasetFormat.JSON:
-                        data = json.load(f)
+                        data = orjson.loads(f.read())
                         if isinstance(data, list):
                             read_items = data
                         else:
                             read_items = [data]
-                    elif format_type in (DatasetFormat.CSV, DatasetFormat.TSV):
-                        delimiter = "," if format_type == DatasetFormat.CSV else "\t"
-                        reader = csv.DictReader(f, delimiter=delimiter)
-                        for row in reader:
-                            read_items.append(dict(row))
-                return read_items
+                # 键名清理与解析一起在线程中完成, 不占用事件循环
+                return [normalize_json_keys(it) for it in read_items]
 
             items = await asyncio.to_thread(read_content)
-            items = [normalize_json_keys(it) for it in items]
 
             if not items:
                 return
@@ -1238,22 +1528,23 @@ async def process_dataset_append(
                     await deduplicator.add_to_index(non_dup_texts)
                     deduplicator.save_index(index_path)
 
-            # 写入新数据项
-            batch_size = 1000
+            # 写入新数据项 (Core 批量 INSERT, 不经过 ORM 工作单元)
+            # 与导入一样所有批次在同一事务内, 最后随状态更新一起提交
+            batch_size = IMPORT_BATCH_SIZE
+            item_types = ItemTypeCache()
             for i in range(0, len(items_to_add), batch_size):
                 batch = items_to_add[i : i + batch_size]
-                for seq_offset, item_content in enumerate(batch):
-                    item_type = detect_item_type(item_content)
-                    data_item = DataItem(
-                        dataset_id=dataset.id,
-                        seq_num=current_max_seq + i + seq_offset + 1,
-                        item_type=item_type,
-                        original_content=item_content,
-                        current_content=item_content,
-                        status=ItemStatus.PENDING,
-                    )
-                    db.add(data_item)
-                await db.commit()
+                rows = [
+                    {
+                        "dataset_id": dataset.id,
+                        "seq_num": current_max_seq + i + seq_offset + 1,
+                        "item_type": item_types.detect(item_content),
+                        "original_content": item_content,
+                        "status": ItemStatus.PENDING,
+                    }
+                    for seq_offset, item_content in enumerate(batch)
+                ]
+                await db.execute(insert(DataItem), rows)
 
             # 更新数据集条目数
             start_seq = current_max_seq + 1
@@ -1432,13 +1723,8 @@ async def upload_directory(
         os.makedirs(os.path.dirname(full_path), exist_ok=True)
 
         print(f"  → Saving to: {full_path}")
-        with open(full_path, "wb") as buffer:
-            while True:
-                chunk = await file.read(1024 * 1024 * 10)  # 10MB chunks
-                if not chunk:
-                    break
-                buffer.write(chunk)
-        print(f"  → ✓ File saved, size: {os.path.getsize(full_path)} bytes")
+        file_size = await save_upload_file(file, full_path)
+        print(f"  → ✓ File saved, size: {file_size} bytes")
 
         # 解析目录路径
         folder_path = os.path.dirname(relative_path)
@@ -1476,15 +1762,8 @@ async def upload_directory(
                 continue
 
             # 检测格式
-            if filename.endswith(".jsonl"):
-                format_type = DatasetFormat.JSONL
-            elif filename.endswith(".json"):
-                format_type = DatasetFormat.JSON
-            elif filename.endswith(".csv"):
-                format_type = DatasetFormat.CSV
-            elif filename.endswith(".tsv"):
-                format_type = DatasetFormat.TSV
-            else:
+            format_type = FILE_FORMAT_MAP.get(get_file_ext(filename))
+            if format_type is None:
                 continue
 
             # 创建数据集
@@ -1532,6 +1811,7 @@ async def upload_directory(
             )
 
     await db.commit()
+    invalidate_folder_tree_cache(current_user.id)
 
     print(f"\n{'='*60}")
     print(f"[upload_directory] COMPLETE")
@@ -1,10 +1,13 @@
 import logging
-from typing import Optional
+import time
+from datetime import datetime
+from typing import Dict, Optional, Tuple
 
 from fastapi import Depends, HTTPException, Query, status
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.core.cache import cache_delete, cache_get_json, cache_set_json
 from app.core.database import get_db
 from app.core.security import decode_token, oauth2_scheme, oauth2_scheme_optional
 from app.models.auth_code import AuthCode, AuthCodeSession
@@ -12,6 +15,142 @@ from app.models.user import User, UserRole
 
 logger = logging.getLogger(__name__)
 
+# 当前用户信息的缓存时间（秒）
+USER_CACHE_TTL = 300
+
+# 进程内一级缓存：命中时连 Redis 也不访问；TTL 较短，跨进程的变更最多延迟这么久生效
+USER_LOCAL_CACHE_TTL = 30
+USER_LOCAL_CACHE_SIZE = 10000
+
+# user_id -> (过期时间, 用户字段)
+_user_local_cache: Dict[int, Tuple[float, dict]] = {}
+
+# 授权码会话的进程内缓存；离开会话时本进程立即失效，其他进程命中时查 Redis 中的离开标记
+AUTH_SESSION_LOCAL_CACHE_TTL = 30
+AUTH_SESSION_LOCAL_CACHE_SIZE = 10000
+
+# 离开标记的保留时间（秒）：须长于进程内缓存，保证各进程的旧缓存过期前都能看到标记
+AUTH_SESSION_LEFT_MARKER_TTL = AUTH_SESSION_LOCAL_CACHE_TTL * 2
+
+# 会话及其授权码中鉴权用到的字段
+_AUTH_SESSION_FIELDS = ("id", "auth_code_id", "session_token", "is_left", "expires_at")
+_AUTH_CODE_FIELDS = (
+    "id",
+    "dataset_id",
+    "item_start",
+    "item_end",
+    "item_ids",
+    "permission",
+    "creator_id",
+    # 预先构建的 item_ids 集合, 缓存命中时不必重建
+    "item_id_set",
+)
+
+# session_token -> (过期时间, 会话字段, 授权码字段)
+_auth_session_local_cache: Dict[str, Tuple[float, dict, dict]] = {}
+
+
+def user_cache_key(user_id: int) -> str:
+    return f"user:{user_id}"
+
+
+def _local_user_get(user_id: int) -> Optional[dict]:
+    entry = _user_local_cache.get(user_id)
+    if entry is None:
+        return None
+    if entry[0] < time.monotonic():
+        _user_local_cache.pop(user_id, None)
+        return None
+    return entry[1]
+
+
+def _local_user_set(user_id: int, fields: dict) -> None:
+    if (
+        user_id not in _user_local_cache
+        and len(_user_local_cache) >= USER_LOCAL_CACHE_SIZE
+    ):
+        # 淘汰最早写入的条目
+        _user_local_cache.pop(next(iter(_user_local_cache)))
+    _user_local_cache[user_id] = (time.monotonic() + USER_LOCAL_CACHE_TTL, fields)
+
+
+async def invalidate_user_cache(user_id: int) -> None:
+    """用户信息变更后失效缓存（本进程一级缓存 + Redis）"""
+    _user_local_cache.pop(user_id, None)
+    await cache_delete(user_cache_key(user_id))
+
+
+def auth_session_left_key(session_token: str) -> str:
+    return f"auth_session:left:{session_token}"
+
+
+def _local_auth_session_get(session_token: str) -> Optional[Tuple[float, dict, dict]]:
+    entry = _auth_session_local_cache.get(session_token)
+    if entry is None:
+        return None
+    if entry[0] < time.monotonic():
+        _auth_session_local_cache.pop(session_token, None)
+        return None
+    return entry
+
+
+async def invalidate_auth_session_cache(session_token: str) -> None:
+    """离开会话后失效缓存（本进程直接删除，其他进程通过 Redis 离开标记失效）"""
+    _auth_session_local_cache.pop(session_token, None)
+    await cache_set_json(
+        auth_session_left_key(session_token), True, AUTH_SESSION_LEFT_MARKER_TTL
+    )
+
+
+async def load_user(db: AsyncSession, user_id: int) -> Optional[User]:
+    """按 id 加载用户（进程内缓存 -> Redis -> 数据库，逐级回填）
+
+    缓存命中时返回未绑定会话的 User，仅包含基本字段，调用方只应读取这些字段。
+    用户信息变更后需调用 invalidate_user_cache(user_id) 失效缓存。
+    """
+    fields = _local_user_get(user_id)
+    if fields is not None:
+        return User(**fields)
+
+    key = user_cache_key(user_id)
+    cached = await cache_get_json(key)
+    if cached is not None:
+        cached["role"] = UserRole(cached["role"])
+        if cached["created_at"] is not None:
+            cached["created_at"] = datetime.fromisoformat(cached["created_at"])
+        _local_user_set(user_id, cached)
+        return User(**cached)
+
+    result = await db.execute(select(User).where(User.id == user_id))
+    user = result.scalar_one_or_none()
+    if user is not None:
+        _local_user_set(
+            user_id,
+            {
+                "id": user.id,
+                "username": user.username,
+                "email": user.email,
+                "role": user.role,
+                "is_active": user.is_active,
+                "created_at": user.created_at,
+            },
+        )
+        await cache_set_json(
+            key,
+            {
+                "id": user.id,
+                "username": user.username,
+                "email": user.email,
+                "role": user.role.value,
+                "is_active": user.is_active,
+                "created_at": (
+                    user.created_at.isoformat() if user.created_at else None
+                ),
+            },
+            USER_CACHE_TTL,
+        )
+    return user
+
 
 async def get_current_user(
     token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)
@@ -37,8 +176,7 @@ async def get_current_user(
     except (TypeError, ValueError):
         raise credentials_exception
 
-    result = await db.execute(select(User).where(User.id == user_id))
-    user = result.scalar_one_or_none()
+    user = await load_user(db, user_id)
 
     if user is None:
         raise credentials_exception
@@ -51,6 +189,21 @@ async def get_current_user(
     return user
 
 
+async def verify_query_token(token: Optional[str] = Query(None)) -> dict:
+    """校验通过 query parameter 传递的令牌 (用于 iframe 等无法带请求头的场景)
+
+    decode_token 自带短时缓存, 同一令牌的连续请求 (如 PDF 分段加载) 不必重复验签。
+    """
+    if not token:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="需要认证")
+    payload = decode_token(token)
+    if not payload:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="无效的令牌"
+        )
+    return payload
+
+
 async def get_current_admin(current_user: User = Depends(get_current_user)) -> User:
     """获取当前管理员用户"""
     if current_user.role not in [UserRole.SUPER_ADMIN, UserRole.ADMIN]:
@@ -70,8 +223,7 @@ async def get_optional_user(
         if payload is None:
             return None
         user_id = int(payload.get("sub"))
-        result = await db.execute(select(User).where(User.id == user_id))
-        return result.scalar_one_or_none()
+        return await load_user(db, user_id)
     except Exception:
         return None
 
@@ -80,14 +232,29 @@ async def verify_session_token(
     session_token: str = Query(None),
     db: AsyncSession = Depends(get_db),
 ) -> Optional[AuthCodeSession]:
-    """验证授权码session_token"""
+    """验证授权码session_token
+
+    会话与授权码一次联表查询取出并缓存在进程内；缓存命中时先检查 Redis 中的离开标记，
+    再返回未绑定会话的对象，仅包含鉴权用到的字段。
+    """
     if not session_token:
         return None
 
+    entry = _local_auth_session_get(session_token)
+    if entry is not None:
+        # 会话可能已在其他进程离开
+        if await cache_get_json(auth_session_left_key(session_token)):
+            _auth_session_local_cache.pop(session_token, None)
+            return None
+        return AuthCodeSession(**entry[1])
+
     result = await db.execute(
-        select(AuthCodeSession).where(AuthCodeSession.session_token == session_token)
+        select(AuthCodeSession, AuthCode)
+        .outerjoin(AuthCode, AuthCode.id == AuthCodeSession.auth_code_id)
+        .where(AuthCodeSession.session_token == session_token)
     )
-    session = result.scalar_one_or_none()
+    row = result.first()
+    session, auth_code = row if row is not None else (None, None)
     if logger.isEnabledFor(logging.DEBUG):
         logger.debug(
             "verify_session_token lookup",
@@ -107,6 +274,19 @@ async def verify_session_token(
             )
         return None
 
+    if auth_code is not None:
+        if (
+            session_token not in _auth_session_local_cache
+            and len(_auth_session_local_cache) >= AUTH_SESSION_LOCAL_CACHE_SIZE
+        ):
+            # 淘汰最早写入的条目
+            _auth_session_local_cache.pop(next(iter(_auth_session_local_cache)))
+        _auth_session_local_cache[session_token] = (
+            time.monotonic() + AUTH_SESSION_LOCAL_CACHE_TTL,
+            {f: getattr(session, f) for f in _AUTH_SESSION_FIELDS},
+            {f: getattr(auth_code, f) for f in _AUTH_CODE_FIELDS},
+        )
+
     return session
 
 
@@ -114,10 +294,14 @@ async def get_auth_code_from_session(
     session: Optional[AuthCodeSession] = Depends(verify_session_token),
     db: AsyncSession = Depends(get_db),
 ) -> Optional[AuthCode]:
-    """从session获取授权码"""
+    """从session获取授权码（优先使用 verify_session_token 写入的缓存）"""
     if not session:
         return None
 
+    entry = _local_auth_session_get(session.session_token)
+    if entry is not None:
+        return AuthCode(**entry[2])
+
     result = await db.execute(
         select(AuthCode).where(AuthCode.id == session.auth_code_id)
     )
@@ -1,23 +1,35 @@
 import csv
 import io
-import json
 import zipfile
 from typing import List, Optional
 
+import orjson
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from sqlalchemy import and_, select
+from sqlalchemy import and_, exists, func, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.api.deps import get_current_user
-from app.core.database import get_db
+from app.core.database import AsyncSessionLocal, get_db
 from app.models.data_item import DataItem, ItemStatus
 from app.models.dataset import Dataset
 from app.models.user import User
 
 router = APIRouter()
 
+# 导出序列化选项: 非字符串键与 json.dumps 一样转为字符串
+ORJSON_EXPORT_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+# 导出时服务端游标每批读取的条数
+EXPORT_YIELD_PER = 1000
+
+# 流式导出 CSV 时每次输出的最小字符数, 避免逐行发送
+EXPORT_FLUSH_SIZE = 64 * 1024
+
+# 状态筛选参数 -> ItemStatus (无效值查不到时忽略筛选)
+ITEM_STATUS_BY_VALUE = {s.value: s for s in ItemStatus}
+
 
 class BatchExportRequest(BaseModel):
     dataset_ids: List[int]
@@ -45,48 +57,51 @@ async def export_batch(
                 continue
 
             conditions = [DataItem.dataset_id == dataset_id]
-            if request.status_filter:
-                try:
-                    status_enum = ItemStatus(request.status_filter)
-                    conditions.append(DataItem.status == status_enum)
-                except ValueError:
-                    pass
+            status_enum = ITEM_STATUS_BY_VALUE.get(request.status_filter)
+            if status_enum is not None:
+                conditions.append(DataItem.status == status_enum)
 
+            # 只查询导出用到的列, 不构建 ORM 对象;
+            # content 是刚解码出的独立字典, 可直接补充元数据字段而不必复制
             items_result = await db.execute(
-                select(DataItem).where(and_(*conditions)).order_by(DataItem.seq_num)
+                select(
+                    DataItem.seq_num,
+                    DataItem.status,
+                    DataItem.current_content.label("content"),
+                    DataItem.has_changes.label("has_changes"),
+                    DataItem.original_content,
+                )
+                .where(and_(*conditions))
+                .order_by(DataItem.seq_num)
             )
-            items = items_result.scalars().all()
+            items = items_result.all()
 
             safe_name = dataset.name.replace("/", "_").replace("\\", "_")
 
             if request.format == "jsonl":
                 lines = []
                 for item in items:
-                    row = item.current_content.copy()
+                    row = item.content
                     row["_status"] = item.status.value
                     row["_seq_num"] = item.seq_num
-                    if (
-                        request.include_original
-                        and item.original_content != item.current_content
-                    ):
+                    if request.include_original and item.has_changes:
                         row["_original"] = item.original_content
-                    lines.append(json.dumps(row, ensure_ascii=False))
-                content = "\n".join(lines)
+                    lines.append(orjson.dumps(row, option=ORJSON_EXPORT_OPTIONS))
+                content = b"\n".join(lines)
                 filename = f"{safe_name}_export.jsonl"
 
             elif request.format == "json":
                 data = []
                 for item in items:
-                    row = item.current_content.copy()
+                    row = item.content
                     row["_status"] = item.status.value
                     row["_seq_num"] = item.seq_num
-                    if (
-                        request.include_original
-                        and item.original_content != item.current_content
-                    ):
+                    if request.include_original and item.has_changes:
                         row["_original"] = item.original_content
                     data.append(row)
-                content = json.dumps(data, ensure_ascii=False, indent=2)
+                content = orjson.dumps(
+                    data, option=ORJSON_EXPORT_OPTIONS | orjson.OPT_INDENT_2
+                )
                 filename = f"{safe_name}_export.json"
 
             elif request.format == "csv":
@@ -94,7 +109,7 @@ async def export_batch(
                 if items:
                     all_fields: set = set()
                     for item in items:
-                        c = item.current_content
+                        c = item.content
                         if isinstance(c, dict):
                             if "messages" in c:
                                 all_fields.update(["question", "answer"])
@@ -105,7 +120,7 @@ async def export_batch(
                     writer = csv.DictWriter(out, fieldnames=fieldnames)
                     writer.writeheader()
                     for item in items:
-                        c = item.current_content
+                        c = item.content
                         row_d = {"_status": item.status.value, "_seq_num": item.seq_num}
                         if isinstance(c, dict):
                             if "messages" in c:
@@ -117,12 +132,12 @@ async def export_batch(
                             else:
                                 row_d.update(c)
                         writer.writerow(row_d)
-                content = out.getvalue()
+                content = out.getvalue().encode("utf-8")
                 filename = f"{safe_name}_export.csv"
             else:
                 continue
 
-            zf.writestr(filename, content.encode("utf-8"))
+            zf.writestr(filename, content)
 
     zip_buffer.seek(0)
     return StreamingResponse(
@@ -156,40 +171,63 @@ async def export_dataset(
 
     # 构建查询
     conditions = [DataItem.dataset_id == dataset_id]
-    if status_filter:
-        try:
-            status_enum = ItemStatus(status_filter)
-            conditions.append(DataItem.status == status_enum)
-        except ValueError:
-            pass
-
-    result = await db.execute(
-        select(DataItem).where(and_(*conditions)).order_by(DataItem.seq_num)
-    )
-    items = result.scalars().all()
+    status_enum = ITEM_STATUS_BY_VALUE.get(status_filter)
+    if status_enum is not None:
+        conditions.append(DataItem.status == status_enum)
 
-    # 根据格式导出
+    # 在响应生成器中边查询边输出, 不预先加载全部数据项
     if format == "jsonl":
-        return export_jsonl(items, dataset.name, include_original)
+        return export_jsonl(conditions, dataset.name, include_original)
     elif format == "json":
-        return export_json(items, dataset.name, include_original)
+        return export_json(conditions, dataset.name, include_original)
     elif format == "csv":
-        return export_csv(items, dataset.name, include_original)
+        return export_csv(conditions, dataset.name, include_original)
     else:
         raise HTTPException(status_code=400, detail="不支持的导出格式")
 
 
-def export_jsonl(items, dataset_name: str, include_original: bool):
-    """导出为JSONL格式"""
+async def iter_export_batches(db: AsyncSession, conditions, include_original: bool):
+    """按序号用服务端游标分批读取要导出的数据 (每批 EXPORT_YIELD_PER 行)
+
+    只查询导出用到的列, 返回 Row 而不构建 ORM 对象: content (当前内容),
+    status, seq_num, has_changes, 以及需要时的 original_content。
+    content 是刚解码出的独立字典, 调用方可直接修改, 不必复制。
+    响应生成器需自行打开会话, 请求依赖的会话在开始发送响应前已关闭。
+    """
+    columns = [
+        DataItem.seq_num,
+        DataItem.status,
+        DataItem.current_content.label("content"),
+        DataItem.has_changes.label("has_changes"),
+    ]
+    if include_original:
+        columns.append(DataItem.original_content)
+    rows = await db.stream(
+        select(*columns)
+        .where(and_(*conditions))
+        .order_by(DataItem.seq_num)
+        .execution_options(yield_per=EXPORT_YIELD_PER)
+    )
+    async for batch in rows.partitions():
+        yield batch
+
 
-    def generate():
-        for item in items:
-            data = item.current_content.copy()
-            data["_status"] = item.status.value
-            data["_seq_num"] = item.seq_num
-            if include_original and item.original_content != item.current_content:
-                data["_original"] = item.original_content
-            yield json.dumps(data, ensure_ascii=False) + "\n"
+def export_jsonl(conditions, dataset_name: str, include_original: bool):
+    """导出为JSONL格式 (每批条目编码后一次输出)"""
+
+    async def generate():
+        async with AsyncSessionLocal() as db:
+            async for batch in iter_export_batches(db, conditions, include_original):
+                lines = []
+                for row in batch:
+                    data = row.content
+                    data["_status"] = row.status.value
+                    data["_seq_num"] = row.seq_num
+                    if include_original and row.has_changes:
+                        data["_original"] = row.original_content
+                    lines.append(orjson.dumps(data, option=ORJSON_EXPORT_OPTIONS))
+                    lines.append(b"\n")
+                yield b"".join(lines)
 
     return StreamingResponse(
         generate(),
@@ -200,21 +238,33 @@ def export_jsonl(items, dataset_name: str, include_original: bool):
     )
 
 
-def export_json(items, dataset_name: str, include_original: bool):
-    """导出为JSON格式"""
-    data = []
-    for item in items:
-        record = item.current_content.copy()
-        record["_status"] = item.status.value
-        record["_seq_num"] = item.seq_num
-        if include_original and item.original_content != item.current_content:
-            record["_original"] = item.original_content
-        data.append(record)
+def export_json(conditions, dataset_name: str, include_original: bool):
+    """导出为JSON格式
+
+    逐条序列化并输出数组元素, 不在内存中拼出整个数组;
+    每条记录单独一行 (不再整体缩进)。
+    """
 
-    content = json.dumps(data, ensure_ascii=False, indent=2)
+    async def generate():
+        async with AsyncSessionLocal() as db:
+            separator = b"[\n"
+            async for batch in iter_export_batches(db, conditions, include_original):
+                parts = []
+                for row in batch:
+                    record = row.content
+                    record["_status"] = row.status.value
+                    record["_seq_num"] = row.seq_num
+                    if include_original and row.has_changes:
+                        record["_original"] = row.original_content
+                    parts.append(separator)
+                    parts.append(orjson.dumps(record, option=ORJSON_EXPORT_OPTIONS))
+                    separator = b",\n"
+                yield b"".join(parts)
+            # 没有数据项时输出空数组
+            yield b"[]\n" if separator == b"[\n" else b"\n]\n"
 
     return StreamingResponse(
-        iter([content]),
+        generate(),
         media_type="application/json",
         headers={
             "Content-Disposition": f'attachment; filename="{dataset_name}_export.json"'
@@ -222,61 +272,98 @@ def export_json(items, dataset_name: str, include_original: bool):
     )
 
 
-def export_csv(items, dataset_name: str, include_original: bool):
-    """导出为CSV格式"""
-    output = io.StringIO()
-
-    if not items:
-        return StreamingResponse(
-            iter([""]),
-            media_type="text/csv",
-            headers={
-                "Content-Disposition": f'attachment; filename="{dataset_name}_export.csv"'
-            },
-        )
-
-    # 收集所有可能的字段
-    all_fields = set()
-    for item in items:
-        content = item.current_content
-        if isinstance(content, dict):
-            # 展平 messages 格式
-            if "messages" in content:
-                all_fields.add("question")
-                all_fields.add("answer")
-            else:
-                all_fields.update(content.keys())
+class _CsvBuffer:
+    """csv.writer 的写入目标, 攒够 EXPORT_FLUSH_SIZE 再整块输出"""
 
-    all_fields.add("_status")
-    all_fields.add("_seq_num")
-    if include_original:
-        all_fields.add("_has_changes")
+    def __init__(self):
+        self._parts = []
+        self.size = 0
 
-    fieldnames = sorted(list(all_fields))
-    writer = csv.DictWriter(output, fieldnames=fieldnames)
-    writer.writeheader()
+    def write(self, s: str) -> None:
+        self._parts.append(s)
+        self.size += len(s)
 
-    for item in items:
-        content = item.current_content
-        row = {"_status": item.status.value, "_seq_num": item.seq_num}
+    def pop(self) -> str:
+        chunk = "".join(self._parts)
+        self._parts.clear()
+        self.size = 0
+        return chunk
 
-        if isinstance(content, dict):
-            if "messages" in content:
-                messages = content.get("messages", [])
-                row["question"] = messages[0]["content"] if len(messages) > 0 else ""
-                row["answer"] = messages[1]["content"] if len(messages) > 1 else ""
-            else:
-                row.update(content)
 
-        if include_original:
-            row["_has_changes"] = item.original_content != item.current_content
+def export_csv(conditions, dataset_name: str, include_original: bool):
+    """导出为CSV格式
+
+    响应生成器自行打开会话 (请求依赖的会话在开始发送响应前已关闭),
+    用服务端游标流式读取数据项, 按 EXPORT_FLUSH_SIZE 分块输出,
+    内存占用与条目数无关。
+    """
 
-        writer.writerow(row)
+    async def generate():
+        async with AsyncSessionLocal() as db:
+            # 在数据库端汇总字段名, 不必把内容传回来扫描
+            # (messages 格式的条目展平为 question/answer, 不计入其自身的键)
+            content_expr = DataItem.current_content
+            is_object = func.json_typeof(content_expr) == "object"
+            has_messages_key = content_expr["messages"].isnot(None)
+            fields_result = await db.execute(
+                select(func.json_object_keys(content_expr))
+                .where(and_(*conditions), is_object, ~has_messages_key)
+                .distinct()
+            )
+            all_fields = set(fields_result.scalars())
 
-    output.seek(0)
+            flags_result = await db.execute(
+                select(
+                    exists().where(and_(*conditions)),
+                    exists().where(and_(*conditions), is_object, has_messages_key),
+                )
+            )
+            has_items, has_messages = flags_result.one()
+            if not has_items:
+                return
+
+            if has_messages:
+                all_fields.add("question")
+                all_fields.add("answer")
+            all_fields.add("_status")
+            all_fields.add("_seq_num")
+            if include_original:
+                all_fields.add("_has_changes")
+
+            buffer = _CsvBuffer()
+            fieldnames = sorted(list(all_fields))
+            writer = csv.DictWriter(buffer, fieldnames=fieldnames)
+            writer.writeheader()
+
+            # CSV 不输出原始内容, 只需要 has_changes 标记
+            async for batch in iter_export_batches(db, conditions, False):
+                for item in batch:
+                    content = item.content
+                    row = {"_status": item.status.value, "_seq_num": item.seq_num}
+
+                    if isinstance(content, dict):
+                        if "messages" in content:
+                            messages = content.get("messages", [])
+                            row["question"] = (
+                                messages[0]["content"] if len(messages) > 0 else ""
+                            )
+                            row["answer"] = (
+                                messages[1]["content"] if len(messages) > 1 else ""
+                            )
+                        else:
+                            row.update(content)
+
+                    if include_original:
+                        row["_has_changes"] = item.has_changes
+
+                    writer.writerow(row)
+                    if buffer.size >= EXPORT_FLUSH_SIZE:
+                        yield buffer.pop()
+
+            yield buffer.pop()
 
     return StreamingResponse(
-        iter([output.getvalue()]),
+        generate(),
         media_type="text/csv",
         headers={
             "Content-Disposition": f'attachment; filename="{dataset_name}_export.csv"'
@@ -1,10 +1,13 @@
 """
 Folder management API endpoints.
 """
-from typing import List, Optional
+import hashlib
+import time
+from typing import Dict, List, Optional, Tuple
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy import func, select
+import orjson
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, status
+from sqlalchemy import delete, exists, func, literal, select
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
@@ -20,71 +23,123 @@ from app.schemas.folder import (
     FolderTreeNode,
     FolderUpdate,
 )
+from app.utils import etag_matches
 
 router = APIRouter()
 
 # 最大嵌套层数
 MAX_FOLDER_DEPTH = 5
 
+# 目录树响应的进程内缓存时间（秒）；目录或数据集归属变更时主动失效,
+# 其他进程中的变更最多延迟这么久生效
+FOLDER_TREE_CACHE_TTL = 30
+
+# 所有者 id (None 表示超级管理员看到的全部目录) -> (过期时间, 响应体, ETag)
+_folder_tree_cache: Dict[Optional[int], Tuple[float, bytes, str]] = {}
+
+
+def invalidate_folder_tree_cache(owner_id: Optional[int] = None) -> None:
+    """目录树变更后失效缓存
+
+    指定 owner_id 时失效该用户及全部目录视图的缓存, 否则清空全部缓存。
+    """
+    if owner_id is None:
+        _folder_tree_cache.clear()
+    else:
+        _folder_tree_cache.pop(owner_id, None)
+        _folder_tree_cache.pop(None, None)
+
+
+def folder_ancestors_cte(folder_id: int):
+    """目录及其各级父目录的递归 CTE (id, parent_id, level)
+
+    level 从该目录的 1 开始向上递增; 最多向上 MAX_FOLDER_DEPTH + 1 层,
+    数据异常成环时也会终止。
+    """
+    ancestors = (
+        select(Folder.id, Folder.parent_id, literal(1).label("level"))
+        .where(Folder.id == folder_id)
+        .cte("folder_ancestors", recursive=True)
+    )
+    return ancestors.union_all(
+        select(Folder.id, Folder.parent_id, ancestors.c.level + 1)
+        .join(ancestors, Folder.id == ancestors.c.parent_id)
+        .where(ancestors.c.level <= MAX_FOLDER_DEPTH)
+    )
+
+
+def folder_depth_query(folder_id: int):
+    """计算目录嵌套深度的查询 (递归 CTE 沿父目录向上, 一次往返)
+
+    深度即从该目录到根目录 (含两端) 的目录数, 目录不存在时为 NULL。
+    """
+    ancestors = folder_ancestors_cte(folder_id)
+    return select(func.max(ancestors.c.level))
+
 
 async def get_folder_depth(db: AsyncSession, folder_id: int) -> int:
     """计算目录的嵌套深度"""
-    depth = 0
-    current_id = folder_id
-    
-    while current_id is not None and depth < MAX_FOLDER_DEPTH + 1:
-        result = await db.execute(
-            select(Folder.parent_id).where(Folder.id == current_id)
-        )
-        row = result.first()
-        if row is None:
-            break
-        current_id = row[0]
-        depth += 1
-    
-    return depth
+    result = await db.execute(folder_depth_query(folder_id))
+    return result.scalar() or 0
 
 
 async def build_folder_tree(
-    db: AsyncSession, 
-    owner_id: int, 
-    parent_id: Optional[int] = None
+    db: AsyncSession,
+    owner_id: Optional[int] = None,
 ) -> List[FolderTreeNode]:
-    """递归构建目录树"""
-    # 获取当前层级的目录
-    result = await db.execute(
-        select(Folder)
-        .where(Folder.owner_id == owner_id)
-        .where(Folder.parent_id == parent_id)
-        .order_by(Folder.name)
+    """构建目录树
+
+    一次查询取出全部目录、一次分组查询统计各目录的数据集数量, 再在内存中组装,
+    查询次数与目录数量无关。owner_id 为 None 时返回所有用户的目录树,
+    每棵子树只包含与其根目录同一所有者的目录。
+    """
+    folder_query = select(
+        Folder.id, Folder.name, Folder.parent_id, Folder.owner_id
+    ).order_by(Folder.name)
+    if owner_id is not None:
+        folder_query = folder_query.where(Folder.owner_id == owner_id)
+    result = await db.execute(folder_query)
+    folders = result.all()
+    if not folders:
+        return []
+
+    # 统计各目录下的数据集数量
+    count_query = select(Dataset.folder_id, func.count(Dataset.id)).group_by(
+        Dataset.folder_id
     )
-    folders = result.scalars().all()
-    
-    tree = []
+    if owner_id is not None:
+        count_query = count_query.where(
+            Dataset.folder_id.in_(select(Folder.id).where(Folder.owner_id == owner_id))
+        )
+    else:
+        count_query = count_query.where(Dataset.folder_id.isnot(None))
+    count_result = await db.execute(count_query)
+    dataset_counts = dict(count_result.all())
+
+    # (所有者, 父目录) -> 子目录列表 (保持按名称排序)
+    children_by_parent = {}
     for folder in folders:
-        # 统计该目录下的数据集数量
-        count_result = await db.execute(
-            select(func.count(Dataset.id))
-            .where(Dataset.folder_id == folder.id)
+        children_by_parent.setdefault((folder.owner_id, folder.parent_id), []).append(
+            folder
         )
-        dataset_count = count_result.scalar() or 0
-        
-        # 递归获取子目录
-        children = await build_folder_tree(db, owner_id, folder.id)
-        
-        tree.append(FolderTreeNode(
+
+    def build_node(folder) -> FolderTreeNode:
+        children = children_by_parent.get((folder.owner_id, folder.id), [])
+        return FolderTreeNode(
             id=folder.id,
             name=folder.name,
             parent_id=folder.parent_id,
-            children=children,
-            dataset_count=dataset_count,
-        ))
-    
-    return tree
+            children=[build_node(child) for child in children],
+            dataset_count=dataset_counts.get(folder.id, 0),
+        )
+
+    # 从根目录开始组装 (超级管理员视图下各用户的根目录按名称合并排序)
+    return [build_node(folder) for folder in folders if folder.parent_id is None]
 
 
 @router.get("", response_model=List[FolderTreeNode])
 async def list_folders(
+    if_none_match: Optional[str] = Header(None),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
@@ -92,44 +147,26 @@ async def list_folders(
     获取目录树
     - 超级管理员可以查看所有目录
     - 普通管理员只能查看自己创建的目录
+    - 返回 ETag, 客户端带 If-None-Match 且目录树未变时返回 304
     """
     from app.models.user import UserRole
-    
-    if current_user.role == UserRole.SUPER_ADMIN:
-        # 超级管理员：获取所有用户的目录树（合并显示）
-        # 这里简化处理：查询所有根目录
-        root_folders_result = await db.execute(
-            select(Folder)
-            .where(Folder.parent_id.is_(None))
-            .order_by(Folder.name)
-        )
-        root_folders = root_folders_result.scalars().all()
-        
-        tree = []
-        for folder in root_folders:
-            # 统计数据集数量
-            dataset_count_result = await db.execute(
-                select(func.count(Dataset.id)).where(Dataset.folder_id == folder.id)
-            )
-            dataset_count = dataset_count_result.scalar() or 0
-            
-            # 递归构建子树（使用原 owner_id）
-            children = await build_folder_tree(db, folder.owner_id, folder.id)
-            
-            tree.append(FolderTreeNode(
-                id=folder.id,
-                name=folder.name,
-                parent_id=folder.parent_id,
-                created_at=folder.created_at,
-                updated_at=folder.updated_at,
-                children=children,
-                dataset_count=dataset_count,
-            ))
-        return tree
-    else:
-        # 普通管理员：只看自己的目录
-        tree = await build_folder_tree(db, current_user.id)
-        return tree
+
+    # 超级管理员：获取所有用户的目录树（合并显示）；普通管理员：只看自己的目录
+    owner_id = None if current_user.role == UserRole.SUPER_ADMIN else current_user.id
+
+    entry = _folder_tree_cache.get(owner_id)
+    if entry is None or entry[0] < time.monotonic():
+        tree = await build_folder_tree(db, owner_id)
+        body = orjson.dumps([node.model_dump() for node in tree])
+        etag = '"%s"' % hashlib.blake2b(body, digest_size=16).hexdigest()
+        entry = (time.monotonic() + FOLDER_TREE_CACHE_TTL, body, etag)
+        _folder_tree_cache[owner_id] = entry
+    _, body, etag = entry
+
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
 
 
 @router.post("", response_model=FolderResponse, status_code=status.HTTP_201_CREATED)
@@ -141,41 +178,48 @@ async def create_folder(
     """
     创建新目录
     """
-    # 检查父目录
+    # 同级目录名称是否重复
+    name_conflict = exists().where(
+        Folder.owner_id == current_user.id,
+        Folder.parent_id == folder_in.parent_id,
+        Folder.name == folder_in.name,
+    )
+
     if folder_in.parent_id is not None:
-        parent_result = await db.execute(
-            select(Folder)
-            .where(Folder.id == folder_in.parent_id)
-            .where(Folder.owner_id == current_user.id)
+        # 父目录是否存在、嵌套深度、重名检查合并为一次查询
+        check_result = await db.execute(
+            select(
+                exists().where(
+                    Folder.id == folder_in.parent_id,
+                    Folder.owner_id == current_user.id,
+                ),
+                folder_depth_query(folder_in.parent_id).scalar_subquery(),
+                name_conflict,
+            )
         )
-        parent = parent_result.scalar_one_or_none()
-        if parent is None:
+        parent_exists, depth, has_conflict = check_result.one()
+        if not parent_exists:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="父目录不存在"
             )
-        
+
         # 检查嵌套深度
-        depth = await get_folder_depth(db, folder_in.parent_id)
-        if depth >= MAX_FOLDER_DEPTH - 1:
+        if (depth or 0) >= MAX_FOLDER_DEPTH - 1:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=f"目录嵌套层数不能超过 {MAX_FOLDER_DEPTH} 层"
             )
-    
-    # 检查同级目录名称是否重复
-    existing_result = await db.execute(
-        select(Folder)
-        .where(Folder.owner_id == current_user.id)
-        .where(Folder.parent_id == folder_in.parent_id)
-        .where(Folder.name == folder_in.name)
-    )
-    if existing_result.scalar_one_or_none():
+    else:
+        check_result = await db.execute(select(name_conflict))
+        has_conflict = check_result.scalar()
+
+    if has_conflict:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="同级目录下已存在同名目录"
         )
-    
+
     # 创建目录
     folder = Folder(
         name=folder_in.name,
@@ -185,6 +229,7 @@ async def create_folder(
     db.add(folder)
     await db.commit()
     await db.refresh(folder)
+    invalidate_folder_tree_cache(current_user.id)
     
     return folder
 
@@ -254,6 +299,7 @@ async def update_folder(
     folder.name = folder_in.name
     await db.commit()
     await db.refresh(folder)
+    invalidate_folder_tree_cache(current_user.id)
     
     return folder
 
@@ -267,43 +313,41 @@ async def delete_folder(
     """
     删除目录（必须为空）
     """
-    result = await db.execute(
-        select(Folder)
-        .where(Folder.id == folder_id)
-        .where(Folder.owner_id == current_user.id)
+    # 目录是否存在、是否有子目录、是否有数据集合并为一次查询
+    check_result = await db.execute(
+        select(
+            exists().where(
+                Folder.id == folder_id, Folder.owner_id == current_user.id
+            ),
+            exists().where(Folder.parent_id == folder_id),
+            exists().where(Dataset.folder_id == folder_id),
+        )
     )
-    folder = result.scalar_one_or_none()
-    
-    if folder is None:
+    folder_exists, has_children, has_datasets = check_result.one()
+
+    if not folder_exists:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="目录不存在"
         )
     
     # 检查是否有子目录
-    children_result = await db.execute(
-        select(func.count(Folder.id))
-        .where(Folder.parent_id == folder_id)
-    )
-    if children_result.scalar() > 0:
+    if has_children:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="目录下存在子目录，请先删除子目录"
         )
     
     # 检查是否有数据集
-    datasets_result = await db.execute(
-        select(func.count(Dataset.id))
-        .where(Dataset.folder_id == folder_id)
-    )
-    if datasets_result.scalar() > 0:
+    if has_datasets:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="目录下存在数据集，请先移动或删除数据集"
         )
     
-    await db.delete(folder)
+    await db.execute(delete(Folder).where(Folder.id == folder_id))
     await db.commit()
+    invalidate_folder_tree_cache(current_user.id)
 
 
 @router.put("/{folder_id}/move", response_model=FolderResponse)
@@ -337,37 +381,33 @@ async def move_folder(
                 detail="不能将目录移动到自己下面"
             )
         
-        # 检查目标是否是自己的子目录
-        current_id = move_in.parent_id
-        while current_id is not None:
-            if current_id == folder_id:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="不能将目录移动到自己的子目录下"
-                )
-            parent_result = await db.execute(
-                select(Folder.parent_id).where(Folder.id == current_id)
-            )
-            row = parent_result.first()
-            if row is None:
-                break
-            current_id = row[0]
-        
-        # 检查目标目录是否存在
+        # 目标目录的祖先链只查一次: 是否包含自己 (即目标是自己的子目录)、
+        # 目标目录是否存在、嵌套深度
+        ancestors = folder_ancestors_cte(move_in.parent_id)
         target_result = await db.execute(
-            select(Folder)
-            .where(Folder.id == move_in.parent_id)
-            .where(Folder.owner_id == current_user.id)
+            select(
+                func.bool_or(ancestors.c.id == folder_id),
+                exists().where(
+                    Folder.id == move_in.parent_id,
+                    Folder.owner_id == current_user.id,
+                ),
+                func.max(ancestors.c.level),
+            ).select_from(ancestors)
         )
-        if target_result.scalar_one_or_none() is None:
+        is_descendant, target_exists, depth = target_result.one()
+        if is_descendant:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="不能将目录移动到自己的子目录下"
+            )
+        if not target_exists:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="目标目录不存在"
             )
         
         # 检查嵌套深度
-        depth = await get_folder_depth(db, move_in.parent_id)
-        if depth >= MAX_FOLDER_DEPTH - 1:
+        if (depth or 0) >= MAX_FOLDER_DEPTH - 1:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=f"目录嵌套层数不能超过 {MAX_FOLDER_DEPTH} 层"
@@ -376,5 +416,6 @@ async def move_folder(
     folder.parent_id = move_in.parent_id
     await db.commit()
     await db.refresh(folder)
+    invalidate_folder_tree_cache(current_user.id)
     
     return folder
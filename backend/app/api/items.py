@@ -1,9 +1,9 @@
+import asyncio
 import logging
-from datetime import datetime
 from typing import Optional
 
 from fastapi import APIRouter, Depends, HTTPException, Query, status
-from sqlalchemy import and_, func, select, update
+from sqlalchemy import and_, exists, func, insert, null, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.api.deps import (
@@ -12,7 +12,7 @@ from app.api.deps import (
     get_optional_user,
     verify_session_token,
 )
-from app.core.database import get_db
+from app.core.database import AsyncSessionLocal, get_db
 from app.models.auth_code import AuthCode, AuthCodeSession
 from app.models.data_item import DataItem, ItemStatus, ItemSource
 from app.models.dataset import Dataset
@@ -32,6 +32,57 @@ logger = logging.getLogger(__name__)
 router = APIRouter()
 
 
+# 构建语料响应所需的列 (列表查询直接选取这些列, 行可直接传给 item_response)
+ITEM_RESPONSE_COLUMNS = (
+    DataItem.id,
+    DataItem.dataset_id,
+    DataItem.seq_num,
+    DataItem.item_type,
+    DataItem.original_content,
+    # 未修改时为 NULL, 不重复传输原始内容
+    DataItem._current_content.label("current_content"),
+    DataItem.status,
+    DataItem.is_marked,
+    DataItem.source,
+    DataItem.added_by,
+    DataItem.assigned_to,
+    DataItem.reviewed_by,
+    DataItem.reviewed_at,
+    DataItem.created_at,
+    DataItem.updated_at,
+    DataItem.has_changes.label("has_changes"),
+)
+
+
+def item_response(item) -> DataItemResponse:
+    """构建语料响应 (item 可以是 DataItem 对象, 也可以是按 ITEM_RESPONSE_COLUMNS 查询的行)
+
+    内容在写入时 (导入、追加、新建、修改) 已规范化键名, 读取时直接返回;
+    规范化之前导入的旧数据用 scripts/normalize_items.py 一次性处理。
+    字段都来自数据库中类型确定的列, 用 model_construct 跳过逐字段校验。
+    """
+    return DataItemResponse.model_construct(
+        id=item.id,
+        dataset_id=item.dataset_id,
+        seq_num=item.seq_num,
+        item_type=item.item_type,
+        original_content=item.original_content,
+        current_content=(
+            item.current_content if item.has_changes else item.original_content
+        ),
+        status=item.status,
+        is_marked=bool(item.is_marked),
+        source=item.source or ItemSource.IMPORTED,
+        added_by=item.added_by,
+        assigned_to=item.assigned_to,
+        reviewed_by=item.reviewed_by,
+        reviewed_at=item.reviewed_at,
+        created_at=item.created_at,
+        updated_at=item.updated_at,
+        has_changes=item.has_changes,
+    )
+
+
 @router.post(
     "/create", response_model=DataItemResponse, status_code=status.HTTP_201_CREATED
 )
@@ -53,8 +104,8 @@ async def create_item(
         dataset_id=item_data.dataset_id,
         seq_num=current_max_seq + 1,
         item_type=item_data.item_type,
-        original_content=item_data.content,
-        current_content=item_data.content,
+        # 写入前规范化键名（移除 BOM 等不可见字符）, 读取时无需再处理
+        original_content=normalize_json_keys(item_data.content),
         status=ItemStatus.PENDING,  # 初始状态为待审核
         source=ItemSource.USER_ADDED,
         added_by=current_user.id,
@@ -81,11 +132,15 @@ async def list_items(
     status_filter: Optional[ItemStatus] = None,
     is_marked: Optional[bool] = None,
     task_id: Optional[int] = None,
+    after_seq: Optional[int] = None,
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
-    """获取数据集的语料列表"""
-    offset = (page - 1) * page_size
+    """获取数据集的语料列表
+
+    - after_seq: 游标分页, 返回序号大于该值的下一页 (取上一页的 next_cursor);
+      传入时忽略 page, 深翻页无需扫描并丢弃前面的行。page 分页仅为兼容保留
+    """
 
     # 构建查询条件
     conditions = [DataItem.dataset_id == dataset_id]
@@ -110,60 +165,66 @@ async def list_items(
             conditions.append(DataItem.seq_num >= task.item_start)
             conditions.append(DataItem.seq_num <= task.item_end)
 
+    # 各状态数量与标记数量只受任务范围限制, 不受状态/标记筛选影响
+    base_conditions = list(conditions)
+
     if status_filter:
         conditions.append(DataItem.status == status_filter)
     if is_marked is not None:
         conditions.append(DataItem.is_marked == is_marked)
 
-    # 查询总数
-    count_result = await db.execute(
-        select(func.count(DataItem.id)).where(and_(*conditions))
-    )
-    total = count_result.scalar()
-
-    # 查询各状态数量（需要使用任务范围的基础条件）
-    base_conditions = [DataItem.dataset_id == dataset_id]
-    if task_id:
-        # 添加任务范围过滤
-        if task.item_ids:
-            base_conditions.append(DataItem.id.in_(task.item_ids))
-        else:
-            base_conditions.append(DataItem.seq_num >= task.item_start)
-            base_conditions.append(DataItem.seq_num <= task.item_end)
-
-    stats = {}
-    for s in ItemStatus:
-        stat_conditions = base_conditions + [DataItem.status == s]
-        stat_result = await db.execute(
-            select(func.count(DataItem.id)).where(and_(*stat_conditions))
-        )
-        stats[s.value] = stat_result.scalar()
-
-    # 查询标记数量
-    marked_conditions = base_conditions + [DataItem.is_marked == True]
-    marked_result = await db.execute(
-        select(func.count(DataItem.id)).where(and_(*marked_conditions))
-    )
-    marked_count = marked_result.scalar()
-
     # 查询数据
-    result = await db.execute(
-        select(DataItem)
+    # 只查询响应需要的列, 返回 Row 而不构建 ORM 对象 (也就不会触发关系懒加载)
+    query = (
+        select(*ITEM_RESPONSE_COLUMNS)
         .where(and_(*conditions))
         .order_by(DataItem.seq_num)
-        .offset(offset)
         .limit(page_size)
     )
-    items = result.scalars().all()
+    if after_seq is not None:
+        # 按 (dataset_id, seq_num) 索引直接定位到游标之后
+        query = query.where(DataItem.seq_num > after_seq)
+    else:
+        query = query.offset((page - 1) * page_size)
+
+    # 一次分组查询得到各状态数量、标记数量, 并据此算出筛选后的总数
+    stats_query = (
+        select(
+            DataItem.status,
+            func.count(),
+            func.count().filter(DataItem.is_marked == True),
+            func.count().filter(DataItem.is_marked == False),
+        )
+        .where(and_(*base_conditions))
+        .group_by(DataItem.status)
+    )
+
+    async def fetch_stats():
+        # 同一会话不能并发执行语句, 统计查询使用单独的会话 (连接)
+        async with AsyncSessionLocal() as stats_db:
+            stats_result = await stats_db.execute(stats_query)
+            return stats_result.all()
+
+    # 统计与分页查询互不依赖, 并发执行
+    stats_rows, result = await asyncio.gather(fetch_stats(), db.execute(query))
+    items = result.all()
+
+    stats = {}
+    marked_count = 0
+    total = 0
+    for item_status, count, marked, unmarked in stats_rows:
+        if item_status is not None:
+            stats[item_status.value] = count
+        marked_count += marked
+        if status_filter and item_status != status_filter:
+            continue
+        if is_marked is None:
+            total += count
+        else:
+            total += marked if is_marked else unmarked
 
-    # 标记是否有修改，并规范化响应中的 JSON 键（移除 BOM 等不可见字符）
-    item_responses = []
-    for item in items:
-        item.original_content = normalize_json_keys(item.original_content)
-        item.current_content = normalize_json_keys(item.current_content)
-        response = DataItemResponse.model_validate(item)
-        response.has_changes = item.original_content != item.current_content
-        item_responses.append(response)
+    # 标记是否有修改
+    item_responses = [item_response(item) for item in items]
 
     return DataItemListResponse(
         items=item_responses,
@@ -175,6 +236,7 @@ async def list_items(
         rejected_count=stats.get("rejected", 0),
         modified_count=stats.get("modified", 0),
         marked_count=marked_count,
+        next_cursor=items[-1].seq_num if len(items) == page_size else None,
     )
 
 
@@ -193,29 +255,22 @@ async def get_item(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="需要登录或有效的授权码"
         )
 
-    result = await db.execute(select(DataItem).where(DataItem.id == item_id))
-    item = result.scalar_one_or_none()
-
-    if not item:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="语料不存在")
-
-    # 如果是授权码访问，验证范围
     if auth_code:
-        if item.dataset_id != auth_code.dataset_id:
-            raise HTTPException(status_code=403, detail="授权码无权访问该数据集")
-
-        if auth_code.item_ids:
-            if item.id not in auth_code.item_ids:
-                raise HTTPException(status_code=403, detail="该语料不在授权范围内")
-        elif item.seq_num < auth_code.item_start or item.seq_num > auth_code.item_end:
-            raise HTTPException(status_code=403, detail="序号超出授权范围")
+        # 授权范围作为查询条件, 越权请求在数据库中即被过滤
+        result = await db.execute(
+            select(DataItem).where(*item_scope_conditions(item_id, auth_code))
+        )
+        item = result.scalar_one_or_none()
+        if not item:
+            await raise_item_not_found(db, item_id, auth_code)
+    else:
+        item = await db.get(DataItem, item_id)
+        if not item:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND, detail="语料不存在"
+            )
 
-    # 规范化返回的 JSON 字段，避免键名中带有 BOM 等不可见字符
-    item.original_content = normalize_json_keys(item.original_content)
-    item.current_content = normalize_json_keys(item.current_content)
-    response = DataItemResponse.model_validate(item)
-    response.has_changes = item.original_content != item.current_content
-    return response
+    return item_response(item)
 
 
 @router.get("/dataset/{dataset_id}/seq/{seq_num}", response_model=DataItemResponse)
@@ -234,40 +289,86 @@ async def get_item_by_seq(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="需要登录或有效的授权码"
         )
 
-    # 如果是授权码访问，验证范围
+    conditions = [DataItem.dataset_id == dataset_id, DataItem.seq_num == seq_num]
     if auth_code:
         if dataset_id != auth_code.dataset_id:
             raise HTTPException(status_code=403, detail="授权码无权访问该数据集")
+        # 授权范围作为查询条件, 越权请求在数据库中即被过滤
+        conditions.extend(auth_scope_conditions(auth_code))
 
-        # 优先检查 item_ids
-        if auth_code.item_ids:
-            # 这里需要查询 seq_num 对应的 item_id 是否在 item_ids 中
-            # 但为了性能，我们先查询出 item，再检查 ID
-            pass  # 将在查询到 item 后检查
-        elif seq_num < auth_code.item_start or seq_num > auth_code.item_end:
-            raise HTTPException(status_code=403, detail="序号超出授权范围")
-
-    result = await db.execute(
-        select(DataItem).where(
-            and_(DataItem.dataset_id == dataset_id, DataItem.seq_num == seq_num)
-        )
-    )
+    result = await db.execute(select(DataItem).where(*conditions))
     item = result.scalar_one_or_none()
 
     if not item:
+        if auth_code:
+            # 仅在未命中时区分 "不存在" 与 "超出授权范围"
+            exists_result = await db.execute(
+                select(
+                    exists().where(
+                        DataItem.dataset_id == dataset_id,
+                        DataItem.seq_num == seq_num,
+                    )
+                )
+            )
+            if exists_result.scalar():
+                logger.info(
+                    "授权码 %s 访问超出范围的语料: dataset=%s seq=%s",
+                    auth_code.id,
+                    dataset_id,
+                    seq_num,
+                )
+                raise HTTPException(status_code=403, detail="该语料不在授权范围内")
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="语料不存在")
 
-    # 再次检查授权范围 (针对 item_ids)
-    if auth_code and auth_code.item_ids:
-        if item.id not in auth_code.item_ids:
+    return item_response(item)
+
+
+def check_auth_code_scope(item, auth_code: AuthCode) -> None:
+    """验证语料是否在授权码范围内, 不在时抛出 403"""
+    if item.dataset_id != auth_code.dataset_id:
+        raise HTTPException(status_code=403, detail="授权码无权访问该数据集")
+
+    if auth_code.item_ids:
+        if item.id not in auth_code.item_id_set:
             raise HTTPException(status_code=403, detail="该语料不在授权范围内")
+    elif item.seq_num < auth_code.item_start or item.seq_num > auth_code.item_end:
+        raise HTTPException(status_code=403, detail="序号超出授权范围")
+
+
+def auth_scope_conditions(auth_code: AuthCode) -> list:
+    """授权码的访问范围 (数据集 + item_ids 或序号区间) 对应的 WHERE 条件"""
+    conditions = [DataItem.dataset_id == auth_code.dataset_id]
+    if auth_code.item_ids:
+        conditions.append(DataItem.id.in_(auth_code.item_ids))
+    else:
+        conditions.append(
+            DataItem.seq_num.between(auth_code.item_start, auth_code.item_end)
+        )
+    return conditions
+
+
+def item_scope_conditions(item_id: int, auth_code: Optional[AuthCode]) -> list:
+    """按 id 查询/更新语料时的 WHERE 条件 (授权码访问时附加授权范围)"""
+    conditions = [DataItem.id == item_id]
+    if auth_code:
+        conditions.extend(auth_scope_conditions(auth_code))
+    return conditions
 
-    # 规范化返回的 JSON 字段，避免键名中带有 BOM 等不可见字符
-    item.original_content = normalize_json_keys(item.original_content)
-    item.current_content = normalize_json_keys(item.current_content)
-    response = DataItemResponse.model_validate(item)
-    response.has_changes = item.original_content != item.current_content
-    return response
+
+async def raise_item_not_found(
+    db: AsyncSession, item_id: int, auth_code: Optional[AuthCode]
+) -> None:
+    """带授权范围的查询/更新未命中时查明原因: 语料不存在 (404) 或超出授权范围 (403)"""
+    result = await db.execute(
+        select(DataItem.id, DataItem.dataset_id, DataItem.seq_num).where(
+            DataItem.id == item_id
+        )
+    )
+    row = result.one_or_none()
+    if row is not None and auth_code:
+        logger.info("授权码 %s 访问超出范围的语料: item=%s", auth_code.id, item_id)
+        check_auth_code_scope(row, auth_code)
+    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="语料不存在")
 
 
 @router.put("/{item_id}", response_model=DataItemResponse)
@@ -318,64 +419,63 @@ async def update_item(
     if auth_code and auth_code.permission == "view":
         raise HTTPException(status_code=403, detail="授权码仅有查看权限")
 
-    result = await db.execute(select(DataItem).where(DataItem.id == item_id))
-    item = result.scalar_one_or_none()
-
-    if not item:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="语料不存在")
-
-    # 如果是授权码访问，验证范围
-    if auth_code:
-        if item.dataset_id != auth_code.dataset_id:
-            raise HTTPException(status_code=403, detail="授权码无权访问该数据集")
-
-        if auth_code.item_ids:
-            if item.id not in auth_code.item_ids:
-                raise HTTPException(status_code=403, detail="该语料不在授权范围内")
-        elif item.seq_num < auth_code.item_start or item.seq_num > auth_code.item_end:
-            raise HTTPException(status_code=403, detail="序号超出授权范围")
-
-    # 创建修改记录（仅登录用户）
-    if current_user:
-        revision = Revision(
-            item_id=item.id,
-            user_id=current_user.id,
-            previous_content=item.current_content,
-            new_content=update_data.current_content,
-            comment=update_data.comment,
+    # 规范化内容以避免键名中携带不可见字符（例如 BOM）导致前端解析问题
+    new_content = normalize_json_keys(update_data.current_content)
+
+    # 锁定并读出修改前的内容 (授权码访问时附加授权范围)
+    locked = await db.execute(
+        select(
+            DataItem.original_content,
+            DataItem.current_content.label("previous_content"),
+            DataItem.status,
         )
-        db.add(revision)
+        .where(*item_scope_conditions(item_id, auth_code))
+        .with_for_update()
+    )
+    previous = locked.one_or_none()
+    if previous is None:
+        await raise_item_not_found(db, item_id, auth_code)
 
-    # 更新语料
-    # 规范化内容以避免键名中携带不可见字符（例如 BOM）导致前端解析问题
-    from app.utils import normalize_json_keys
+    # 在 Python 中按值比较解码后的内容 (json 列可含 \u0000, 无法在库中转为 jsonb 比较);
+    # 只有内容与原始内容不同时才存储当前内容
+    content_changed = new_content != previous.original_content
 
-    item.current_content = normalize_json_keys(update_data.current_content)
-    if update_data.status:
-        item.status = update_data.status
-    elif item.current_content != item.original_content:
+    values = {
+        "_current_content": new_content if content_changed else null(),
         # 只有内容真正改变时才设置为 MODIFIED
-        item.status = ItemStatus.MODIFIED
-
+        "status": update_data.status
+        or (ItemStatus.MODIFIED if content_changed else previous.status),
+        "reviewed_by": current_user.id if current_user else auth_code.creator_id,
+        "reviewed_at": func.now(),
+    }
     if update_data.is_marked is not None:
-        item.is_marked = update_data.is_marked
+        values["is_marked"] = update_data.is_marked
 
+    result = await db.execute(
+        update(DataItem)
+        .where(DataItem.id == item_id)
+        .values(values)
+        .returning(DataItem)
+        .execution_options(synchronize_session=False)
+    )
+    item = result.scalar_one()
+    previous_content = previous.previous_content
+
+    # 创建修改记录（仅登录用户）; 直接 INSERT, 不经过 ORM 工作单元, 也不回取主键
     if current_user:
-        item.reviewed_by = current_user.id
-    elif auth_code:
-        item.reviewed_by = auth_code.creator_id  # 授权码创建者
-    item.reviewed_at = datetime.utcnow()
+        await db.execute(
+            insert(Revision).values(
+                item_id=item.id,
+                user_id=current_user.id,
+                previous_content=previous_content,
+                new_content=update_data.current_content,
+                comment=update_data.comment,
+            )
+        )
 
     await db.commit()
-    await db.refresh(item)
-
-    # 规范化返回的 JSON 字段
-    item.original_content = normalize_json_keys(item.original_content)
-    item.current_content = normalize_json_keys(item.current_content)
 
-    response = DataItemResponse.model_validate(item)
-    response.has_changes = item.original_content != item.current_content
-    return response
+    return item_response(item)
 
 
 @router.post("/{item_id}/approve", response_model=DataItemResponse)
@@ -396,40 +496,24 @@ async def approve_item(
     if auth_code and auth_code.permission == "view":
         raise HTTPException(status_code=403, detail="授权码仅有查看权限")
 
-    result = await db.execute(select(DataItem).where(DataItem.id == item_id))
+    result = await db.execute(
+        update(DataItem)
+        .where(*item_scope_conditions(item_id, auth_code))
+        .values(
+            status=ItemStatus.APPROVED,
+            reviewed_by=current_user.id if current_user else auth_code.creator_id,
+            reviewed_at=func.now(),
+        )
+        .returning(DataItem)
+        .execution_options(synchronize_session=False)
+    )
     item = result.scalar_one_or_none()
-
-    if not item:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="语料不存在")
-
-    # 如果是授权码访问，验证范围
-    if auth_code:
-        if item.dataset_id != auth_code.dataset_id:
-            raise HTTPException(status_code=403, detail="授权码无权访问该数据集")
-
-        if auth_code.item_ids:
-            if item.id not in auth_code.item_ids:
-                raise HTTPException(status_code=403, detail="该语料不在授权范围内")
-        elif item.seq_num < auth_code.item_start or item.seq_num > auth_code.item_end:
-            raise HTTPException(status_code=403, detail="序号超出授权范围")
-
-    item.status = ItemStatus.APPROVED
-    if current_user:
-        item.reviewed_by = current_user.id
-    elif auth_code:
-        item.reviewed_by = auth_code.creator_id
-    item.reviewed_at = datetime.utcnow()
+    if item is None:
+        await raise_item_not_found(db, item_id, auth_code)
 
     await db.commit()
-    await db.refresh(item)
-
-    # 规范化返回的 JSON 字段
-    item.original_content = normalize_json_keys(item.original_content)
-    item.current_content = normalize_json_keys(item.current_content)
 
-    response = DataItemResponse.model_validate(item)
-    response.has_changes = item.original_content != item.current_content
-    return response
+    return item_response(item)
 
 
 @router.post("/{item_id}/reject", response_model=DataItemResponse)
@@ -450,37 +534,21 @@ async def reject_item(
     if auth_code and auth_code.permission == "view":
         raise HTTPException(status_code=403, detail="授权码仅有查看权限")
 
-    result = await db.execute(select(DataItem).where(DataItem.id == item_id))
+    result = await db.execute(
+        update(DataItem)
+        .where(*item_scope_conditions(item_id, auth_code))
+        .values(
+            status=ItemStatus.REJECTED,
+            reviewed_by=current_user.id if current_user else auth_code.creator_id,
+            reviewed_at=func.now(),
+        )
+        .returning(DataItem)
+        .execution_options(synchronize_session=False)
+    )
     item = result.scalar_one_or_none()
-
-    if not item:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="语料不存在")
-
-    # 如果是授权码访问，验证范围
-    if auth_code:
-        if item.dataset_id != auth_code.dataset_id:
-            raise HTTPException(status_code=403, detail="授权码无权访问该数据集")
-
-        if auth_code.item_ids:
-            if item.id not in auth_code.item_ids:
-                raise HTTPException(status_code=403, detail="该语料不在授权范围内")
-        elif item.seq_num < auth_code.item_start or item.seq_num > auth_code.item_end:
-            raise HTTPException(status_code=403, detail="序号超出授权范围")
-
-    item.status = ItemStatus.REJECTED
-    if current_user:
-        item.reviewed_by = current_user.id
-    elif auth_code:
-        item.reviewed_by = auth_code.creator_id
-    item.reviewed_at = datetime.utcnow()
+    if item is None:
+        await raise_item_not_found(db, item_id, auth_code)
 
     await db.commit()
-    await db.refresh(item)
-
-    # 规范化返回的 JSON 字段
-    item.original_content = normalize_json_keys(item.original_content)
-    item.current_content = normalize_json_keys(item.current_content)
 
-    response = DataItemResponse.model_validate(item)
-    response.has_changes = item.original_content != item.current_content
-    return response
+    return item_response(item)
@@ -1,26 +1,33 @@
+import asyncio
+import hashlib
 import os
 import uuid
 from pathlib import Path
+from typing import Optional
 
-from fastapi import APIRouter, Depends, File, HTTPException, Query, UploadFile, status
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, Depends, File, Header, HTTPException, UploadFile, status
+from fastapi.responses import FileResponse, Response
 from sqlalchemy import func, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.api.deps import get_current_user, require_admin
+from app.api.datasets import save_upload_file
+from app.api.deps import get_current_user, require_admin, verify_query_token
 from app.core.config import settings
 from app.core.database import get_db
-from app.core.security import decode_token
 from app.models.dataset import Dataset
 from app.models.reference_doc import ReferenceDoc
 from app.models.user import User
 from app.schemas.reference_doc import ReferenceDocListResponse, ReferenceDocResponse
+from app.utils import etag_matches
 from urllib.parse import quote
 
 router = APIRouter()
 
 ALLOWED_DOC_TYPES = {".pdf", ".doc", ".docx"}
 
+# 查看参考文档的浏览器缓存策略 (过期后凭 ETag 重新验证)
+REFERENCE_DOC_CACHE_CONTROL = "private, max-age=3600, must-revalidate"
+
 
 def build_content_disposition(filename: str, disposition: str = "inline") -> str:
     """构建支持非 ASCII 文件名的 Content-Disposition 头（包含 filename*）"""
@@ -207,24 +214,13 @@ async def upload_reference_doc(
             detail=f"不支持的文件格式 {ext}，仅支持 PDF、DOC、DOCX",
         )
 
-    # 保存文件
-    upload_id = str(uuid.uuid4())
-    save_dir = os.path.join(settings.UPLOAD_DIR, "reference_docs", str(dataset_id))
-    os.makedirs(save_dir, exist_ok=True)
-
-    safe_filename = f"{upload_id}{ext}"
-    file_path = os.path.join(save_dir, safe_filename)
-
-    file_size = 0
-    with open(file_path, "wb") as buffer:
-        while True:
-            chunk = await file.read(1024 * 1024 * 10)  # 10MB chunks
-            if not chunk:
-                break
-            buffer.write(chunk)
-            file_size += len(chunk)
+    # 保存文件; 存储路径 (相对 UPLOAD_DIR, 统一用 /) 直接拼出, 不必再由绝对路径反推
+    relative_path = f"reference_docs/{dataset_id}/{uuid.uuid4()}{ext}"
+    file_path = Path(settings.UPLOAD_DIR) / relative_path
+    # 建目录也是磁盘 IO, 放到线程中执行
+    await asyncio.to_thread(file_path.parent.mkdir, parents=True, exist_ok=True)
 
-    relative_path = os.path.relpath(file_path, settings.UPLOAD_DIR).replace("\\", "/")
+    file_size = await save_upload_file(file, str(file_path))
 
     # 创建记录
     doc = ReferenceDoc(
@@ -249,7 +245,9 @@ async def list_reference_docs(
 ):
     """获取数据集的参考文档列表"""
     count_result = await db.execute(
-        select(func.count(ReferenceDoc.id)).where(ReferenceDoc.dataset_id == dataset_id)
+        select(func.count())
+        .select_from(ReferenceDoc)
+        .where(ReferenceDoc.dataset_id == dataset_id)
     )
     total = count_result.scalar()
 
@@ -266,29 +264,34 @@ async def list_reference_docs(
 @router.get("/{doc_id}/view")
 async def view_reference_doc(
     doc_id: int,
-    token: str = Query(default=None),
+    if_none_match: Optional[str] = Header(None),
     db: AsyncSession = Depends(get_db),
+    _payload: dict = Depends(verify_query_token),
 ):
     """查看/下载参考文档 (支持通过 query parameter 传递 token 用于 iframe)
 
     Word 文档会自动转换为 PDF 后展示
     """
-    # 验证用户身份 (支持 query param token 用于 iframe 场景)
-    if token:
-        payload = decode_token(token)
-        if not payload:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED, detail="无效的令牌"
-            )
-    else:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="需要认证")
-    result = await db.execute(select(ReferenceDoc).where(ReferenceDoc.id == doc_id))
-    doc = result.scalar_one_or_none()
+    doc = await db.get(ReferenceDoc, doc_id)
     if not doc:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="文档不存在")
 
+    # 文档上传后不再修改 (重新上传会生成新记录), 浏览器缓存未过期的内容可直接复用;
+    # 命中时连文件都不用读, Word 文档也不必再转换
+    digest = hashlib.blake2b(
+        f"{doc.id}-{doc.file_path}-{doc.file_size}-{doc.created_at}".encode(),
+        digest_size=16,
+    ).hexdigest()
+    etag = f'"{digest}"'
+    cache_headers = {"ETag": etag, "Cache-Control": REFERENCE_DOC_CACHE_CONTROL}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=cache_headers)
+
     abs_path = os.path.join(settings.UPLOAD_DIR, doc.file_path)
-    if not os.path.exists(abs_path):
+    # 只 stat 一次: 同时判断文件是否存在, 并把结果交给 FileResponse 免得它再 stat
+    try:
+        stat_result = os.stat(abs_path)
+    except FileNotFoundError:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="文档文件不存在"
         )
@@ -304,15 +307,17 @@ async def view_reference_doc(
                 media_type="application/pdf",
                 filename=filename_pdf,
                 headers={
+                    **cache_headers,
                     "Content-Disposition": build_content_disposition(
                         filename_pdf, "inline"
-                    )
+                    ),
                 },
             )
         else:
             # 转换失败，提供原文件下载
             return FileResponse(
                 abs_path,
+                stat_result=stat_result,
                 media_type=(
                     "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
                     if doc.file_type == "docx"
@@ -320,9 +325,10 @@ async def view_reference_doc(
                 ),
                 filename=doc.name,
                 headers={
+                    **cache_headers,
                     "Content-Disposition": build_content_disposition(
                         doc.name, "attachment"
-                    )
+                    ),
                 },
             )
 
@@ -336,10 +342,12 @@ async def view_reference_doc(
     disposition = "inline" if doc.file_type == "pdf" else "attachment"
     return FileResponse(
         abs_path,
+        stat_result=stat_result,
         media_type=media_type,
         filename=doc.name,
         headers={
-            "Content-Disposition": build_content_disposition(doc.name, disposition)
+            **cache_headers,
+            "Content-Disposition": build_content_disposition(doc.name, disposition),
         },
     )
 
@@ -351,8 +359,7 @@ async def delete_reference_doc(
     current_user: User = Depends(require_admin),
 ):
     """删除参考文档"""
-    result = await db.execute(select(ReferenceDoc).where(ReferenceDoc.id == doc_id))
-    doc = result.scalar_one_or_none()
+    doc = await db.get(ReferenceDoc, doc_id)
     if not doc:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="文档不存在")
 
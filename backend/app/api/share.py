@@ -1,8 +1,7 @@
-from datetime import datetime
 from typing import List
 
 from fastapi import APIRouter, Depends, HTTPException, Request, status
-from sqlalchemy import select
+from sqlalchemy import and_, bindparam, func, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.api.deps import get_current_admin, get_current_user
@@ -19,6 +18,22 @@ from app.schemas.share_link import (
 router = APIRouter()
 
 
+def share_link_response(share_link: ShareLink) -> ShareLinkResponse:
+    """构建分享链接响应 (字段来自数据库中类型确定的列, 用 model_construct 跳过校验)"""
+    return ShareLinkResponse.model_construct(
+        id=share_link.id,
+        dataset_id=share_link.dataset_id,
+        token=share_link.token,
+        permission=share_link.permission,
+        expires_at=share_link.expires_at,
+        max_access_count=share_link.max_access_count,
+        access_count=share_link.access_count,
+        is_active=share_link.is_active,
+        created_by=share_link.created_by,
+        created_at=share_link.created_at,
+    )
+
+
 @router.post("", response_model=ShareLinkResponse, status_code=status.HTTP_201_CREATED)
 async def create_share_link(
     share_in: ShareLinkCreate,
@@ -55,7 +70,7 @@ async def create_share_link(
 
     # 生成完整URL
     base_url = str(request.base_url).rstrip("/")
-    response = ShareLinkResponse.model_validate(share_link)
+    response = share_link_response(share_link)
     response.share_url = f"{base_url}/share/{share_link.token}"
 
     return response
@@ -73,29 +88,60 @@ async def list_share_links(
         .where(ShareLink.dataset_id == dataset_id)
         .order_by(ShareLink.created_at.desc())
     )
-    share_links = result.scalars().all()
-    return share_links
+    return [share_link_response(share_link) for share_link in result.scalars()]
+
+
+def share_link_expired():
+    """分享链接已过期 (与数据库时间比较)"""
+    return and_(ShareLink.expires_at.isnot(None), ShareLink.expires_at < func.now())
+
+
+def share_link_exhausted():
+    """分享链接访问次数已达上限 (max_access_count 为空或 0 表示不限)"""
+    return and_(
+        func.coalesce(ShareLink.max_access_count, 0) > 0,
+        ShareLink.access_count >= ShareLink.max_access_count,
+    )
+
+
+# 按令牌校验 / 记录访问的语句在模块加载时构建一次, 请求中只绑定参数
+SHARE_LINK_VALIDATION_STMT = select(
+    ShareLink.is_active,
+    share_link_expired().label("expired"),
+    share_link_exhausted().label("exhausted"),
+    ShareLink.permission,
+    ShareLink.dataset_id,
+).where(ShareLink.token == bindparam("share_token"))
+
+# 校验与计数合并为一条条件 UPDATE, 并发访问时计数不会丢失, 也不会超过上限
+SHARE_LINK_ACCESS_STMT = (
+    update(ShareLink)
+    .where(
+        ShareLink.token == bindparam("share_token"),
+        ShareLink.is_active.is_(True),
+        ~share_link_expired(),
+        ~share_link_exhausted(),
+    )
+    .values(access_count=ShareLink.access_count + 1)
+    .returning(ShareLink.dataset_id, ShareLink.permission)
+)
 
 
 @router.get("/validate/{token}", response_model=ShareLinkValidation)
 async def validate_share_link(token: str, db: AsyncSession = Depends(get_db)):
-    """验证分享链接"""
-    result = await db.execute(select(ShareLink).where(ShareLink.token == token))
-    share_link = result.scalar_one_or_none()
+    """验证分享链接 (有效性判断在数据库中完成)"""
+    result = await db.execute(SHARE_LINK_VALIDATION_STMT, {"share_token": token})
+    share_link = result.one_or_none()
 
     if not share_link:
         return ShareLinkValidation(valid=False, message="分享链接不存在")
 
-    if not share_link.is_valid():
-        if not share_link.is_active:
-            return ShareLinkValidation(valid=False, message="分享链接已禁用")
-        if share_link.expires_at and datetime.utcnow() > share_link.expires_at:
-            return ShareLinkValidation(valid=False, message="分享链接已过期")
-        if (
-            share_link.max_access_count
-            and share_link.access_count >= share_link.max_access_count
-        ):
-            return ShareLinkValidation(valid=False, message="分享链接访问次数已达上限")
+    if not share_link.is_active:
+        return ShareLinkValidation(valid=False, message="分享链接已禁用")
+    if share_link.expired:
+        return ShareLinkValidation(valid=False, message="分享链接已过期")
+    if share_link.exhausted:
+        return ShareLinkValidation(valid=False, message="分享链接访问次数已达上限")
 
     return ShareLinkValidation(
         valid=True, permission=share_link.permission, dataset_id=share_link.dataset_id
@@ -104,15 +150,13 @@ async def validate_share_link(token: str, db: AsyncSession = Depends(get_db)):
 
 @router.post("/access/{token}")
 async def access_share_link(token: str, db: AsyncSession = Depends(get_db)):
-    """记录分享链接访问"""
-    result = await db.execute(select(ShareLink).where(ShareLink.token == token))
-    share_link = result.scalar_one_or_none()
+    """记录分享链接访问 (校验与计数在同一条 UPDATE 中完成)"""
+    result = await db.execute(SHARE_LINK_ACCESS_STMT, {"share_token": token})
+    share_link = result.one_or_none()
 
-    if not share_link or not share_link.is_valid():
+    if not share_link:
         raise HTTPException(status_code=404, detail="分享链接无效")
 
-    # 增加访问计数
-    share_link.access_count += 1
     await db.commit()
 
     return {"dataset_id": share_link.dataset_id, "permission": share_link.permission}
@@ -125,8 +169,7 @@ async def delete_share_link(
     current_user: User = Depends(get_current_user),
 ):
     """删除/禁用分享链接"""
-    result = await db.execute(select(ShareLink).where(ShareLink.id == share_id))
-    share_link = result.scalar_one_or_none()
+    share_link = await db.get(ShareLink, share_id)
 
     if not share_link:
         raise HTTPException(status_code=404, detail="分享链接不存在")
@@ -1,10 +1,21 @@
-from datetime import datetime
 from typing import Optional
 
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy import and_, func, select, update
+from sqlalchemy import (
+    Integer,
+    and_,
+    bindparam,
+    case,
+    cast,
+    exists,
+    func,
+    insert,
+    literal,
+    select,
+    update,
+)
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import joinedload
+from sqlalchemy.orm import aliased, joinedload
 
 from app.api.deps import get_current_user
 from app.core.database import get_db
@@ -17,6 +28,113 @@ from app.schemas.task import TaskCreate, TaskDelegate, TaskListResponse, TaskRes
 router = APIRouter()
 
 
+def task_items_count(*conditions):
+    """任务范围内满足条件的语料数
+
+    返回关联 Task 的标量子查询, 可与任务一起在一条语句中查出, 不必逐个任务再查。
+    与 Python 端一致: item_ids 非空时按 ID 列表统计, 否则按序号范围统计;
+    CASE 只执行命中的分支, 两个分支各自走主键 / (dataset_id, seq_num) 索引。
+    """
+    ids_count = (
+        select(func.count())
+        .select_from(DataItem)
+        .where(
+            DataItem.id.in_(
+                select(
+                    cast(func.json_array_elements_text(Task.item_ids), Integer)
+                ).correlate(Task)
+            ),
+            *conditions,
+        )
+        .scalar_subquery()
+    )
+    range_count = (
+        select(func.count())
+        .select_from(DataItem)
+        .where(
+            DataItem.dataset_id == Task.dataset_id,
+            DataItem.seq_num.between(Task.item_start, Task.item_end),
+            *conditions,
+        )
+        .scalar_subquery()
+    )
+    ids_length = case(
+        (
+            func.json_typeof(Task.item_ids) == "array",
+            func.json_array_length(Task.item_ids),
+        ),
+        else_=0,
+    )
+    return case((ids_length > 0, ids_count), else_=range_count)
+
+
+def task_reviewed_count():
+    """任务范围内已审核 (非待审核) 的语料数"""
+    return task_items_count(DataItem.status != ItemStatus.PENDING).label(
+        "reviewed_items"
+    )
+
+
+# 常用查询在模块加载时构建一次, 请求中只绑定参数
+# (省去每次构建语句和生成编译缓存键的开销)
+TASK_WITH_PROGRESS_STMT = select(Task, task_reviewed_count()).where(
+    Task.id == bindparam("task_id")
+)
+TASK_PROGRESS_STMT = select(task_reviewed_count()).where(
+    Task.id == bindparam("task_id")
+)
+
+
+def task_response(task: Task, reviewed_items: int) -> TaskResponse:
+    """构建带进度信息的任务响应
+
+    字段都来自数据库中类型确定的列, 用 model_construct 跳过逐字段校验。
+    """
+    if task.item_ids:
+        total_items = len(task.item_ids)
+    else:
+        total_items = task.item_end - task.item_start + 1
+    return TaskResponse.model_construct(
+        id=task.id,
+        dataset_id=task.dataset_id,
+        assigner_id=task.assigner_id,
+        assignee_id=task.assignee_id,
+        item_start=task.item_start,
+        item_end=task.item_end,
+        item_ids=task.item_ids,
+        status=task.status,
+        priority=task.priority,
+        note=task.note,
+        due_date=task.due_date,
+        delegated_from_task_id=task.delegated_from_task_id,
+        reviewed_by_assigner=bool(task.reviewed_by_assigner),
+        created_at=task.created_at,
+        completed_at=task.completed_at,
+        total_items=total_items,
+        reviewed_items=reviewed_items,
+    )
+
+
+async def assign_task_items(db: AsyncSession, task: Task, assignee_id: int) -> None:
+    """把任务范围内的语料分配给 assignee_id
+
+    只改写分配人确实变化的行: 大范围任务重复分配 / 委派时,
+    已分配给同一人的行不再产生新的行版本和索引写入。
+    """
+    if task.item_ids:
+        scope = DataItem.id.in_(task.item_ids)
+    else:
+        scope = and_(
+            DataItem.dataset_id == task.dataset_id,
+            DataItem.seq_num.between(task.item_start, task.item_end),
+        )
+    await db.execute(
+        DataItem.__table__.update()
+        .where(scope, DataItem.assigned_to.is_distinct_from(assignee_id))
+        .values(assigned_to=assignee_id)
+    )
+
+
 @router.post("", response_model=TaskResponse, status_code=status.HTTP_201_CREATED)
 async def create_task(
     task_in: TaskCreate,
@@ -24,51 +142,29 @@ async def create_task(
     current_user: User = Depends(get_current_user),  # 允许普通用户创建任务(委派)
 ):
     """创建任务 (管理员或用户委派)"""
-    task = Task(
-        dataset_id=task_in.dataset_id,
-        assigner_id=current_user.id,
-        assignee_id=task_in.assignee_id,
-        item_start=task_in.item_start,
-        item_end=task_in.item_end,
-        item_ids=task_in.item_ids,
-        priority=task_in.priority or 0,
-        note=task_in.note,
-        due_date=task_in.due_date,
+    # INSERT ... RETURNING 直接取回完整的任务行 (含服务端默认值), 提交后不必再 refresh
+    task = await db.scalar(
+        insert(Task)
+        .values(
+            dataset_id=task_in.dataset_id,
+            assigner_id=current_user.id,
+            assignee_id=task_in.assignee_id,
+            item_start=task_in.item_start,
+            item_end=task_in.item_end,
+            item_ids=task_in.item_ids,
+            priority=task_in.priority or 0,
+            note=task_in.note,
+            due_date=task_in.due_date,
+        )
+        .returning(Task)
     )
-    db.add(task)
 
     # 更新对应语料的分配
-    if task_in.item_ids:
-        await db.execute(
-            DataItem.__table__.update()
-            .where(DataItem.id.in_(task_in.item_ids))
-            .values(assigned_to=task_in.assignee_id)
-        )
-    else:
-        await db.execute(
-            DataItem.__table__.update()
-            .where(
-                and_(
-                    DataItem.dataset_id == task_in.dataset_id,
-                    DataItem.seq_num >= task_in.item_start,
-                    DataItem.seq_num <= task_in.item_end,
-                )
-            )
-            .values(assigned_to=task_in.assignee_id)
-        )
+    await assign_task_items(db, task, task_in.assignee_id)
 
     await db.commit()
-    await db.refresh(task)
-
-    # 计算进度
-    response = TaskResponse.model_validate(task)
-    if task.item_ids:
-        response.total_items = len(task.item_ids)
-    else:
-        response.total_items = task.item_end - task.item_start + 1
-    response.reviewed_items = 0
 
-    return response
+    return task_response(task, 0)
 
 
 @router.get("/my", response_model=TaskListResponse)
@@ -82,45 +178,15 @@ async def list_my_tasks(
     if status_filter:
         conditions.append(Task.status == status_filter)
 
+    # 任务与其进度一次查出
     result = await db.execute(
-        select(Task)
+        select(Task, task_reviewed_count())
         .where(and_(*conditions))
         .order_by(Task.priority.desc(), Task.created_at.desc())
     )
-    tasks = result.scalars().all()
-
-    # 计算每个任务的进度
-    task_responses = []
-    for task in tasks:
-        response = TaskResponse.model_validate(task)
-        if task.item_ids:
-            response.total_items = len(task.item_ids)
-
-            # 查询已审核数量 (item_ids)
-            reviewed_result = await db.execute(
-                select(func.count(DataItem.id)).where(
-                    and_(
-                        DataItem.id.in_(task.item_ids),
-                        DataItem.status != ItemStatus.PENDING,
-                    )
-                )
-            )
-        else:
-            response.total_items = task.item_end - task.item_start + 1
-
-            # 查询已审核数量 (range)
-            reviewed_result = await db.execute(
-                select(func.count(DataItem.id)).where(
-                    and_(
-                        DataItem.dataset_id == task.dataset_id,
-                        DataItem.seq_num >= task.item_start,
-                        DataItem.seq_num <= task.item_end,
-                        DataItem.status != ItemStatus.PENDING,
-                    )
-                )
-            )
-        response.reviewed_items = reviewed_result.scalar()
-        task_responses.append(response)
+    task_responses = [
+        task_response(task, reviewed_items) for task, reviewed_items in result
+    ]
 
     return TaskListResponse(items=task_responses, total=len(task_responses))
 
@@ -136,79 +202,32 @@ async def list_assigned_by_me_tasks(
     if status_filter:
         conditions.append(Task.status == status_filter)
 
+    # 任务与各状态数量一次查出
     result = await db.execute(
-        select(Task)
+        select(
+            Task,
+            *(
+                task_items_count(DataItem.status == s).label(s.value)
+                for s in ItemStatus
+            ),
+        )
         .options(joinedload(Task.dataset), joinedload(Task.assignee))
         .where(and_(*conditions))
         .order_by(Task.priority.desc(), Task.created_at.desc())
     )
-    tasks = result.scalars().all()
 
-    # 计算每个任务的进度
     task_responses = []
-    for task in tasks:
-        response = TaskResponse.model_validate(task)
+    for row in result:
+        task = row[0]
+        status_counts = {s.value: row._mapping[s.value] for s in ItemStatus}
+        reviewed_items = (
+            sum(status_counts.values()) - status_counts[ItemStatus.PENDING.value]
+        )
+        response = task_response(task, reviewed_items)
         if task.dataset:
             response.dataset_name = task.dataset.name
         if task.assignee:
             response.assignee_name = task.assignee.username
-
-        if task.item_ids:
-            response.total_items = len(task.item_ids)
-
-            # 查询已审核数量 (item_ids)
-            reviewed_result = await db.execute(
-                select(func.count(DataItem.id)).where(
-                    and_(
-                        DataItem.id.in_(task.item_ids),
-                        DataItem.status != ItemStatus.PENDING,
-                    )
-                )
-            )
-
-            # 查询各状态数量
-            status_counts = {}
-            for status in ItemStatus:
-                status_result = await db.execute(
-                    select(func.count(DataItem.id)).where(
-                        and_(
-                            DataItem.id.in_(task.item_ids),
-                            DataItem.status == status,
-                        )
-                    )
-                )
-                status_counts[status.value] = status_result.scalar()
-        else:
-            response.total_items = task.item_end - task.item_start + 1
-
-            # 查询已审核数量 (range)
-            reviewed_result = await db.execute(
-                select(func.count(DataItem.id)).where(
-                    and_(
-                        DataItem.dataset_id == task.dataset_id,
-                        DataItem.seq_num >= task.item_start,
-                        DataItem.seq_num <= task.item_end,
-                        DataItem.status != ItemStatus.PENDING,
-                    )
-                )
-            )
-
-            # 查询各状态数量
-            status_counts = {}
-            for status in ItemStatus:
-                status_result = await db.execute(
-                    select(func.count(DataItem.id)).where(
-                        and_(
-                            DataItem.dataset_id == task.dataset_id,
-                            DataItem.seq_num >= task.item_start,
-                            DataItem.seq_num <= task.item_end,
-                            DataItem.status == status,
-                        )
-                    )
-                )
-                status_counts[status.value] = status_result.scalar()
-
-        response.reviewed_items = reviewed_result.scalar()
         response.status_counts = status_counts  # type: ignore
         task_responses.append(response)
 
@@ -222,38 +241,14 @@ async def get_task(
     current_user: User = Depends(get_current_user),
 ):
     """获取任务详情"""
-    result = await db.execute(select(Task).where(Task.id == task_id))
-    task = result.scalar_one_or_none()
+    result = await db.execute(TASK_WITH_PROGRESS_STMT, {"task_id": task_id})
+    row = result.one_or_none()
 
-    if not task:
+    if not row:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="任务不存在")
 
-    response = TaskResponse.model_validate(task)
-    if task.item_ids:
-        response.total_items = len(task.item_ids)
-        reviewed_result = await db.execute(
-            select(func.count(DataItem.id)).where(
-                and_(
-                    DataItem.id.in_(task.item_ids),
-                    DataItem.status != ItemStatus.PENDING,
-                )
-            )
-        )
-    else:
-        response.total_items = task.item_end - task.item_start + 1
-        reviewed_result = await db.execute(
-            select(func.count(DataItem.id)).where(
-                and_(
-                    DataItem.dataset_id == task.dataset_id,
-                    DataItem.seq_num >= task.item_start,
-                    DataItem.seq_num <= task.item_end,
-                    DataItem.status != ItemStatus.PENDING,
-                )
-            )
-        )
-    response.reviewed_items = reviewed_result.scalar()
-
-    return response
+    task, reviewed_items = row
+    return task_response(task, reviewed_items)
 
 
 @router.post("/{task_id}/delegate", response_model=TaskResponse)
@@ -264,8 +259,7 @@ async def delegate_task(
     current_user: User = Depends(get_current_user),
 ):
     """委派任务"""
-    result = await db.execute(select(Task).where(Task.id == task_id))
-    task = result.scalar_one_or_none()
+    task = await db.get(Task, task_id)
 
     if not task:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="任务不存在")
@@ -276,55 +270,33 @@ async def delegate_task(
             status_code=status.HTTP_403_FORBIDDEN, detail="只能委派自己的任务"
         )
 
-    # 创建新任务
-    new_task = Task(
-        dataset_id=task.dataset_id,
-        assigner_id=current_user.id,
-        assignee_id=delegate_data.new_assignee_id,
-        item_start=task.item_start,
-        item_end=task.item_end,
-        item_ids=task.item_ids,
-        priority=task.priority,
-        note=delegate_data.note or f"从任务 #{task.id} 委派",
-        due_date=task.due_date,
-        delegated_from_task_id=task.id,
+    # 创建新任务 (INSERT ... RETURNING 取回完整行, 提交后不必再 refresh)
+    new_task = await db.scalar(
+        insert(Task)
+        .values(
+            dataset_id=task.dataset_id,
+            assigner_id=current_user.id,
+            assignee_id=delegate_data.new_assignee_id,
+            item_start=task.item_start,
+            item_end=task.item_end,
+            item_ids=task.item_ids,
+            priority=task.priority,
+            note=delegate_data.note or f"从任务 #{task.id} 委派",
+            due_date=task.due_date,
+            delegated_from_task_id=task.id,
+        )
+        .returning(Task)
     )
-    db.add(new_task)
 
     # 更新原任务状态
     task.status = TaskStatus.DELEGATED
 
     # 更新语料分配
-    if task.item_ids:
-        await db.execute(
-            DataItem.__table__.update()
-            .where(DataItem.id.in_(task.item_ids))
-            .values(assigned_to=delegate_data.new_assignee_id)
-        )
-    else:
-        await db.execute(
-            DataItem.__table__.update()
-            .where(
-                and_(
-                    DataItem.dataset_id == task.dataset_id,
-                    DataItem.seq_num >= task.item_start,
-                    DataItem.seq_num <= task.item_end,
-                )
-            )
-            .values(assigned_to=delegate_data.new_assignee_id)
-        )
+    await assign_task_items(db, task, delegate_data.new_assignee_id)
 
     await db.commit()
-    await db.refresh(new_task)
 
-    response = TaskResponse.model_validate(new_task)
-    if new_task.item_ids:
-        response.total_items = len(new_task.item_ids)
-    else:
-        response.total_items = new_task.item_end - new_task.item_start + 1
-    response.reviewed_items = 0
-
-    return response
+    return task_response(new_task, 0)
 
 
 @router.post("/{task_id}/complete", response_model=TaskResponse)
@@ -334,8 +306,7 @@ async def complete_task(
     current_user: User = Depends(get_current_user),
 ):
     """完成任务"""
-    result = await db.execute(select(Task).where(Task.id == task_id))
-    task = result.scalar_one_or_none()
+    task = await db.get(Task, task_id)
 
     if not task:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="任务不存在")
@@ -346,18 +317,22 @@ async def complete_task(
         )
 
     task.status = TaskStatus.COMPLETED
-    task.completed_at = datetime.utcnow()
+    # 由数据库写入带时区的当前时间 (提交后 refresh 取回)
+    task.completed_at = func.now()
 
-    # 检查数据集是否所有条目均已完成审核，若是则更新数据集状态为 COMPLETED
-    pending_items_result = await db.execute(
-        select(func.count(DataItem.id)).where(
-            and_(
+    # 检查数据集是否所有条目均已完成审核 (同时取回任务进度)
+    check_result = await db.execute(
+        select(
+            exists().where(
                 DataItem.dataset_id == task.dataset_id,
                 DataItem.status == ItemStatus.PENDING,
-            )
-        )
+            ),
+            task_reviewed_count(),
+        ).where(Task.id == task_id)
     )
-    if pending_items_result.scalar() == 0:
+    has_pending, reviewed_items = check_result.one()
+    # 若均已审核则更新数据集状态为 COMPLETED
+    if not has_pending:
         await db.execute(
             update(Dataset)
             .where(Dataset.id == task.dataset_id)
@@ -367,22 +342,7 @@ async def complete_task(
     await db.commit()
     await db.refresh(task)
 
-    response = TaskResponse.model_validate(task)
-    response.total_items = task.item_end - task.item_start + 1
-
-    reviewed_result = await db.execute(
-        select(func.count(DataItem.id)).where(
-            and_(
-                DataItem.dataset_id == task.dataset_id,
-                DataItem.seq_num >= task.item_start,
-                DataItem.seq_num <= task.item_end,
-                DataItem.status != ItemStatus.PENDING,
-            )
-        )
-    )
-    response.reviewed_items = reviewed_result.scalar()
-
-    return response
+    return task_response(task, reviewed_items)
 
 
 @router.post("/{task_id}/mark-reviewed", response_model=TaskResponse)
@@ -392,8 +352,7 @@ async def mark_task_reviewed(
     current_user: User = Depends(get_current_user),
 ):
     """标记任务为已查看（派发者查看已完成的任务）"""
-    result = await db.execute(select(Task).where(Task.id == task_id))
-    task = result.scalar_one_or_none()
+    task = await db.get(Task, task_id)
 
     if not task:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="任务不存在")
@@ -408,32 +367,8 @@ async def mark_task_reviewed(
     await db.commit()
     await db.refresh(task)
 
-    response = TaskResponse.model_validate(task)
-    if task.item_ids:
-        response.total_items = len(task.item_ids)
-        reviewed_result = await db.execute(
-            select(func.count(DataItem.id)).where(
-                and_(
-                    DataItem.id.in_(task.item_ids),
-                    DataItem.status != ItemStatus.PENDING,
-                )
-            )
-        )
-    else:
-        response.total_items = task.item_end - task.item_start + 1
-        reviewed_result = await db.execute(
-            select(func.count(DataItem.id)).where(
-                and_(
-                    DataItem.dataset_id == task.dataset_id,
-                    DataItem.seq_num >= task.item_start,
-                    DataItem.seq_num <= task.item_end,
-                    DataItem.status != ItemStatus.PENDING,
-                )
-            )
-        )
-    response.reviewed_items = reviewed_result.scalar()
-
-    return response
+    reviewed_result = await db.execute(TASK_PROGRESS_STMT, {"task_id": task_id})
+    return task_response(task, reviewed_result.scalar())
 
 
 @router.get("/{task_id}/delegation-history")
@@ -442,59 +377,67 @@ async def get_delegation_history(
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
-    """获取任务委派历史链"""
-    result = await db.execute(select(Task).where(Task.id == task_id))
-    task = result.scalar_one_or_none()
-
-    if not task:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="任务不存在")
-
-    # 向前追溯委派链
-    history = []
-    current_task = task
-
-    while current_task:
-        # 获取分配人和被分配人信息
-        assigner_result = await db.execute(
-            select(User).where(User.id == current_task.assigner_id)
-        )
-        assigner = assigner_result.scalar_one_or_none()
-
-        assignee_result = await db.execute(
-            select(User).where(User.id == current_task.assignee_id)
+    """获取任务委派历史链
+
+    递归 CTE 沿 delegated_from_task_id 向前追溯, 并连接分配人和被分配人,
+    整条委派链一次查询取出。
+    """
+    chain = (
+        select(Task.id, Task.delegated_from_task_id, literal(1).label("depth"))
+        .where(Task.id == task_id)
+        .cte("delegation_chain", recursive=True)
+    )
+    # 委派源任务总是先于委派任务创建 (id 更小), 以此保证递归终止
+    chain = chain.union_all(
+        select(Task.id, Task.delegated_from_task_id, chain.c.depth + 1).join(
+            chain,
+            and_(
+                Task.id == chain.c.delegated_from_task_id,
+                Task.id < chain.c.id,
+            ),
         )
-        assignee = assignee_result.scalar_one_or_none()
-
-        history.append(
-            {
-                "task_id": current_task.id,
-                "assigner": (
-                    {"id": assigner.id, "username": assigner.username}
-                    if assigner
-                    else None
-                ),
-                "assignee": (
-                    {"id": assignee.id, "username": assignee.username}
-                    if assignee
-                    else None
-                ),
-                "status": current_task.status.value,
-                "note": current_task.note,
-                "created_at": current_task.created_at.isoformat(),
-                "is_delegation": current_task.delegated_from_task_id is not None,
-            }
+    )
+    assigner = aliased(User)
+    assignee = aliased(User)
+    result = await db.execute(
+        select(
+            Task,
+            assigner.id,
+            assigner.username,
+            assignee.id,
+            assignee.username,
         )
+        .join(chain, Task.id == chain.c.id)
+        .outerjoin(assigner, assigner.id == Task.assigner_id)
+        .outerjoin(assignee, assignee.id == Task.assignee_id)
+        # 最早的在前
+        .order_by(chain.c.depth.desc())
+    )
+    rows = result.all()
 
-        if current_task.delegated_from_task_id:
-            result = await db.execute(
-                select(Task).where(Task.id == current_task.delegated_from_task_id)
-            )
-            current_task = result.scalar_one_or_none()
-        else:
-            current_task = None
+    if not rows:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="任务不存在")
 
-    # 反转顺序，最早的在前
-    history.reverse()
+    history = [
+        {
+            "task_id": task.id,
+            "assigner": (
+                {"id": assigner_id, "username": assigner_name}
+                if assigner_id is not None
+                else None
+            ),
+            "assignee": (
+                {"id": assignee_id, "username": assignee_name}
+                if assignee_id is not None
+                else None
+            ),
+            "status": task.status.value,
+            "note": task.note,
+            "created_at": task.created_at.isoformat(),
+            "is_delegation": task.delegated_from_task_id is not None,
+        }
+        for task, assigner_id, assigner_name, assignee_id, assignee_name in rows
+    ]
 
     return {"task_id": task_id, "history": history}
 
@@ -524,8 +467,7 @@ async def cancel_task(
     """取消/删除任务（分配人或管理员可操作）"""
     from app.models.user import UserRole
 
-    result = await db.execute(select(Task).where(Task.id == task_id))
-    task = result.scalar_one_or_none()
+    task = await db.get(Task, task_id)
 
     if not task:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="任务不存在")
@@ -1,12 +1,12 @@
 import secrets
 import string
-from typing import List
+from typing import List, Tuple
 
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy import select
+from sqlalchemy import func, or_, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.api.deps import get_current_user, require_admin
+from app.api.deps import get_current_user, invalidate_user_cache, require_admin
 from app.core.database import get_db
 from app.core.security import get_password_hash
 from app.models.dataset import Dataset
@@ -23,6 +23,32 @@ ROLE_HIERARCHY = {
 }
 
 
+def user_response(user: User) -> UserResponse:
+    """构建用户响应 (字段来自数据库中类型确定的列, 用 model_construct 跳过校验)"""
+    return UserResponse.model_construct(
+        id=user.id,
+        username=user.username,
+        email=user.email,
+        role=user.role.value,
+        is_active=user.is_active,
+        created_at=user.created_at,
+    )
+
+
+async def check_user_conflicts(
+    db: AsyncSession, username: str, email: str
+) -> Tuple[bool, bool]:
+    """一次查询判断用户名、邮箱是否已被占用, 返回 (用户名已存在, 邮箱已存在)"""
+    result = await db.execute(
+        select(
+            func.coalesce(func.bool_or(User.username == username), False),
+            func.coalesce(func.bool_or(User.email == email), False),
+        ).where(or_(User.username == username, User.email == email))
+    )
+    username_taken, email_taken = result.one()
+    return username_taken, email_taken
+
+
 @router.get("", response_model=List[UserResponse])
 async def list_users(
     db: AsyncSession = Depends(get_db),
@@ -30,8 +56,7 @@ async def list_users(
 ):
     """获取用户列表"""
     result = await db.execute(select(User).order_by(User.created_at.desc()))
-    users = result.scalars().all()
-    return users
+    return [user_response(user) for user in result.scalars()]
 
 
 @router.get("/{user_id}", response_model=UserResponse)
@@ -41,11 +66,10 @@ async def get_user(
     current_user: User = Depends(require_admin),
 ):
     """获取用户详情"""
-    result = await db.execute(select(User).where(User.id == user_id))
-    user = result.scalar_one_or_none()
+    user = await db.get(User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="用户不存在")
-    return user
+    return user_response(user)
 
 
 @router.post("", response_model=UserResponse)
@@ -55,14 +79,13 @@ async def create_user(
     current_user: User = Depends(require_admin),
 ):
     """创建用户"""
-    # 检查用户名是否存在
-    result = await db.execute(select(User).where(User.username == data.username))
-    if result.scalar_one_or_none():
+    # 用户名、邮箱是否已存在 (一次查询)
+    username_taken, email_taken = await check_user_conflicts(
+        db, data.username, data.email
+    )
+    if username_taken:
         raise HTTPException(status_code=400, detail="用户名已存在")
-
-    # 检查邮箱是否存在
-    result = await db.execute(select(User).where(User.email == data.email))
-    if result.scalar_one_or_none():
+    if email_taken:
         raise HTTPException(status_code=400, detail="邮箱已存在")
 
     # 检查角色权限：只能创建比自己角色等级低的用户
@@ -73,13 +96,13 @@ async def create_user(
     user = User(
         username=data.username,
         email=data.email,
-        password_hash=get_password_hash(data.password),
+        password_hash=await get_password_hash(data.password),
         role=data.role,
     )
     db.add(user)
     await db.commit()
     await db.refresh(user)
-    return user
+    return user_response(user)
 
 
 @router.put("/{user_id}", response_model=UserResponse)
@@ -90,8 +113,7 @@ async def update_user(
     current_user: User = Depends(require_admin),
 ):
     """更新用户"""
-    result = await db.execute(select(User).where(User.id == user_id))
-    user = result.scalar_one_or_none()
+    user = await db.get(User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="用户不存在")
 
@@ -121,8 +143,9 @@ async def update_user(
         user.is_active = data.is_active
 
     await db.commit()
+    await invalidate_user_cache(user.id)
     await db.refresh(user)
-    return user
+    return user_response(user)
 
 
 @router.delete("/{user_id}")
@@ -135,8 +158,7 @@ async def delete_user(
     if user_id == current_user.id:
         raise HTTPException(status_code=400, detail="不能禁用自己")
 
-    result = await db.execute(select(User).where(User.id == user_id))
-    user = result.scalar_one_or_none()
+    user = await db.get(User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="用户不存在")
 
@@ -154,6 +176,7 @@ async def delete_user(
 
     user.is_active = False
     await db.commit()
+    await invalidate_user_cache(user.id)
     return {"message": "用户已禁用"}
 
 
@@ -164,8 +187,7 @@ async def reset_password(
     current_user: User = Depends(require_admin),
 ):
     """重置用户密码"""
-    result = await db.execute(select(User).where(User.id == user_id))
-    user = result.scalar_one_or_none()
+    user = await db.get(User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="用户不存在")
 
@@ -180,7 +202,8 @@ async def reset_password(
     new_password = "".join(
         secrets.choice(string.ascii_letters + string.digits) for _ in range(12)
     )
-    user.password_hash = get_password_hash(new_password)
+    user.password_hash = await get_password_hash(new_password)
 
     await db.commit()
+    await invalidate_user_cache(user.id)
     return {"new_password": new_password}
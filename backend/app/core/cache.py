@@ -0,0 +1,57 @@
+"""
+Redis 缓存 - 热点只读数据的短 TTL 缓存
+
+Redis 仅作为加速层：连接或命令失败时静默降级为未命中，由调用方回源数据库。
+"""
+
+import logging
+from typing import Any, Optional
+
+import orjson
+import redis.asyncio as redis
+from redis.exceptions import RedisError
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+redis_client = redis.from_url(
+    settings.REDIS_URL,
+    socket_timeout=0.5,
+    socket_connect_timeout=0.5,
+)
+
+
+async def cache_get_json(key: str) -> Optional[Any]:
+    """读取 JSON 缓存，未命中或 Redis 不可用时返回 None"""
+    try:
+        raw = await redis_client.get(key)
+    except (RedisError, OSError) as e:
+        logger.warning("redis get %s failed: %s", key, e)
+        return None
+    if raw is None:
+        return None
+    return orjson.loads(raw)
+
+
+async def cache_set_json(key: str, value: Any, ttl: int) -> None:
+    """写入 JSON 缓存（ttl 单位为秒）"""
+    try:
+        await redis_client.set(key, orjson.dumps(value), ex=ttl)
+    except (RedisError, OSError) as e:
+        logger.warning("redis set %s failed: %s", key, e)
+
+
+async def cache_delete(*keys: str) -> None:
+    """删除缓存键"""
+    if not keys:
+        return
+    try:
+        await redis_client.delete(*keys)
+    except (RedisError, OSError) as e:
+        logger.warning("redis delete %s failed: %s", keys, e)
+
+
+async def close_cache() -> None:
+    """关闭 Redis 连接池"""
+    await redis_client.aclose()
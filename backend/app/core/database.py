@@ -1,17 +1,30 @@
+import orjson
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import DeclarativeBase
 
 from app.core.config import settings
 
+
+def _json_serializer(obj) -> str:
+    """JSON 列序列化（orjson；非字符串键与 json.dumps 一样转为字符串）"""
+    return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+
+
 engine = create_async_engine(
     settings.DATABASE_URL,
     echo=settings.DEBUG,
     future=True,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    # JSON/JSONB 列的读写都走 orjson, 代替标准库 json
+    json_serializer=_json_serializer,
+    json_deserializer=orjson.loads,
 )
 
 AsyncSessionLocal = async_sessionmaker(
     engine,
     class_=AsyncSession,
+    # 提交后不过期实例, 读取属性不会再次查询数据库
     expire_on_commit=False,
     autocommit=False,
     autoflush=False,
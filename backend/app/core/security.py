@@ -1,5 +1,7 @@
+import asyncio
+import time
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Dict, Optional, Tuple
 
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
@@ -14,15 +16,22 @@ oauth2_scheme_optional = OAuth2PasswordBearer(
     tokenUrl=f"{settings.API_V1_PREFIX}/auth/login", auto_error=False
 )
 
+# 已验证 token 的缓存时间（秒）, 不会超过 token 自身的过期时间
+TOKEN_CACHE_TTL = 60
+TOKEN_CACHE_SIZE = 10000
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """验证密码"""
-    return pwd_context.verify(plain_password, hashed_password)
+# token -> (缓存失效的时间戳, payload)
+_token_cache: Dict[str, Tuple[float, dict]] = {}
 
 
-def get_password_hash(password: str) -> str:
-    """生成密码哈希"""
-    return pwd_context.hash(password)
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    """验证密码 (bcrypt 计算耗 CPU, 放到线程中执行, 不阻塞事件循环)"""
+    return await asyncio.to_thread(pwd_context.verify, plain_password, hashed_password)
+
+
+async def get_password_hash(password: str) -> str:
+    """生成密码哈希 (在线程中执行)"""
+    return await asyncio.to_thread(pwd_context.hash, password)
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
@@ -46,7 +55,18 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
 
 
 def decode_token(token: str) -> Optional[dict]:
-    """解码JWT token"""
+    """解码JWT token
+
+    验证通过的结果按 token 缓存一小段时间, 同一 token 的后续请求不再重复验签;
+    返回的 payload 为共享对象, 调用方不应修改。
+    """
+    now = time.time()
+    entry = _token_cache.get(token)
+    if entry is not None:
+        if entry[0] > now:
+            return entry[1]
+        _token_cache.pop(token, None)
+
     try:
         payload = jwt.decode(
             token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM]
@@ -54,6 +74,14 @@ def decode_token(token: str) -> Optional[dict]:
         # 将 sub 从字符串转回整数
         if "sub" in payload and payload["sub"] is not None:
             payload["sub"] = int(payload["sub"])
-        return payload
     except JWTError:
         return None
+
+    expires_at = now + TOKEN_CACHE_TTL
+    if isinstance(payload.get("exp"), (int, float)):
+        expires_at = min(expires_at, payload["exp"])
+    if len(_token_cache) >= TOKEN_CACHE_SIZE:
+        # 淘汰最早写入的条目
+        _token_cache.pop(next(iter(_token_cache)))
+    _token_cache[token] = (expires_at, payload)
+    return payload
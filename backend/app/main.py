@@ -1,13 +1,17 @@
+import asyncio
 import os
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from fastapi.staticfiles import StaticFiles
 
 from app.api import api_router
+from app.core.cache import close_cache
 from app.core.config import settings
 from app.core.database import init_db
+from app.services.online_counter import run_online_counter_sync, sync_online_counters
 
 
 @asynccontextmanager
@@ -19,8 +23,16 @@ async def lifespan(app: FastAPI):
 
     # 启动时初始化数据库
     await init_db()
+    # 定期把 Redis 中的在线计数回写数据库
+    online_sync_task = asyncio.create_task(run_online_counter_sync())
     yield
     # 关闭时清理资源
+    online_sync_task.cancel()
+    try:
+        await sync_online_counters()
+    except Exception:
+        pass
+    await close_cache()
 
 
 # 获取 root_path 并确保其格式正确（以 / 开头，不以 / 结尾）
@@ -35,6 +47,8 @@ app = FastAPI(
     openapi_url=f"{settings.API_V1_PREFIX}/openapi.json",
     lifespan=lifespan,
     root_path=root_path,
+    # 所有 JSON 响应统一用 orjson 序列化
+    default_response_class=ORJSONResponse,
 )
 
 # CORS配置
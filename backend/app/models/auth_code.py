@@ -1,5 +1,6 @@
 import random
 import string
+from functools import cached_property
 
 from sqlalchemy import (
     JSON,
@@ -7,6 +8,7 @@ from sqlalchemy import (
     Column,
     DateTime,
     ForeignKey,
+    Index,
     Integer,
     String,
     text,
@@ -67,6 +69,11 @@ class AuthCode(Base):
         cascade="all, delete-orphan",
     )
 
+    @cached_property
+    def item_id_set(self) -> frozenset:
+        """item_ids 的集合形式, 用于 O(1) 判断语料是否在授权范围内 (每个实例只构建一次)"""
+        return frozenset(self.item_ids or ())
+
     @classmethod
     def generate_code(cls) -> str:
         """生成6位数字授权码"""
@@ -124,3 +131,13 @@ class AuthCodeReviewedItem(Base):
     # 关系
     auth_code = relationship("AuthCode", back_populates="reviewed_items")
     item = relationship("DataItem", back_populates="auth_code_reviews")
+
+    __table_args__ = (
+        # 每个授权码对同一语料只记录一次
+        Index(
+            "uq_auth_code_reviewed_items_code_item",
+            "auth_code_id",
+            "item_id",
+            unique=True,
+        ),
+    )
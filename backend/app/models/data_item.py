@@ -3,7 +3,8 @@ from datetime import datetime
 
 from sqlalchemy import JSON, Boolean, Column, DateTime, func
 from sqlalchemy import Enum as SQLEnum
-from sqlalchemy import ForeignKey, Integer, String, Text
+from sqlalchemy import ForeignKey, Index, Integer, String, Text
+from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import relationship
 
 from app.core.database import Base
@@ -30,13 +31,15 @@ class DataItem(Base):
     __tablename__ = "data_items"
 
     id = Column(Integer, primary_key=True, index=True)
-    dataset_id = Column(Integer, ForeignKey("datasets.id"), nullable=False, index=True)
+    # 不单独建索引: (dataset_id, seq_num) 复合索引的前缀已覆盖按 dataset_id 的查询
+    dataset_id = Column(Integer, ForeignKey("datasets.id"), nullable=False)
     seq_num = Column(Integer, nullable=False)  # 在数据集中的序号
     item_type = Column(SQLEnum(ItemType), default=ItemType.PLAIN)
 
     # 内容存储 (JSON格式支持多种结构)
     original_content = Column(JSON, nullable=False)  # 原始内容
-    current_content = Column(JSON, nullable=False)  # 当前内容 (可能已修改)
+    # 当前内容; NULL 表示未修改 (与原始内容相同), 通过 current_content 访问
+    _current_content = Column("current_content", JSON, nullable=True)
 
     status = Column(SQLEnum(ItemStatus), default=ItemStatus.PENDING)
     is_marked = Column(Boolean, default=False)  # 是否被标记(不确定/待定)
@@ -63,6 +66,33 @@ class DataItem(Base):
         DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
     )
 
+    @hybrid_property
+    def current_content(self):
+        """当前内容 (可能已修改), 未修改时即原始内容"""
+        if self._current_content is None:
+            return self.original_content
+        return self._current_content
+
+    @current_content.inplace.setter
+    def _current_content_setter(self, value):
+        # 与原始内容相同时不重复存储
+        self._current_content = None if value == self.original_content else value
+
+    @current_content.inplace.expression
+    @classmethod
+    def _current_content_expression(cls):
+        return func.coalesce(cls._current_content, cls.original_content)
+
+    @hybrid_property
+    def has_changes(self) -> bool:
+        """当前内容是否已修改 (与原始内容相同时不存储当前内容, 只需判断是否为空)"""
+        return self._current_content is not None
+
+    @has_changes.inplace.expression
+    @classmethod
+    def _has_changes_expression(cls):
+        return cls._current_content.isnot(None)
+
     # Relationships
     dataset = relationship("Dataset", back_populates="items")
     assignee = relationship(
@@ -78,4 +108,13 @@ class DataItem(Base):
     # 复合索引
     __table_args__ = (
         # Index for pagination within dataset
+        # (附带 status, 任务进度按序号范围 + 状态计数时可走仅索引扫描)
+        Index(
+            "ix_data_items_dataset_seq_status",
+            "dataset_id",
+            "seq_num",
+            postgresql_include=["status"],
+        ),
+        # 按状态筛选/统计
+        Index("ix_data_items_dataset_status", "dataset_id", "status"),
     )
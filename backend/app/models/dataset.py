@@ -3,7 +3,7 @@ from datetime import datetime
 
 from sqlalchemy import JSON, Column, DateTime, func
 from sqlalchemy import Enum as SQLEnum
-from sqlalchemy import ForeignKey, Integer, String, Text
+from sqlalchemy import ForeignKey, Index, Integer, String, Text
 from sqlalchemy.orm import relationship
 
 from app.core.database import Base
@@ -108,3 +108,8 @@ class Dataset(Base):
     import_histories = relationship(
         "ImportHistory", cascade="all, delete-orphan"
     )
+
+    __table_args__ = (
+        # 目录树统计各目录下的数据集数量
+        Index("idx_datasets_folder_id", "folder_id"),
+    )
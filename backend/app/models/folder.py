@@ -3,7 +3,7 @@ Folder model for organizing datasets into hierarchical directories.
 """
 from datetime import datetime
 
-from sqlalchemy import Column, DateTime, ForeignKey, Integer, String, func
+from sqlalchemy import Column, DateTime, ForeignKey, Index, Integer, String, func
 from sqlalchemy.orm import relationship
 
 from app.core.database import Base
@@ -44,3 +44,8 @@ class Folder(Base):
 
     # 关联：目录下的数据集
     datasets = relationship("Dataset", back_populates="folder")
+
+    __table_args__ = (
+        # 按所有者、父目录列出子目录并按名称排序
+        Index("ix_folders_owner_parent_name", "owner_id", "parent_id", "name"),
+    )
@@ -62,3 +62,6 @@ class DataItemListResponse(BaseModel):
     marked_count: int = 0
     rejected_count: int = 0
     modified_count: int = 0
+
+    # 下一页游标 (本页最后一条的序号), 作为 after_seq 传入; 没有下一页时为 None
+    next_cursor: Optional[int] = None
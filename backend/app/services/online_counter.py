@@ -0,0 +1,161 @@
+"""
+授权码在线计数服务
+
+在线人数计数放在 Redis 中 (authcode:{id}:online)，通过 Lua 脚本原子地检查上限并增减，
+避免并发验证时争用 auth_codes 行锁；后台任务定期把变动过的计数写回数据库。
+Redis 不可用时各函数返回 None，由调用方退回数据库计数路径。
+"""
+
+import asyncio
+import logging
+from typing import Optional
+
+from redis.exceptions import RedisError
+from sqlalchemy import bindparam, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.cache import redis_client
+from app.core.database import AsyncSessionLocal
+from app.models.auth_code import AuthCode
+
+logger = logging.getLogger(__name__)
+
+# 计数回写数据库的间隔（秒）
+ONLINE_SYNC_INTERVAL = 30
+
+# 计数有变动、等待回写的授权码 id 集合
+ONLINE_DIRTY_KEY = "authcode:online:dirty"
+
+# KEYS[1]=计数键 KEYS[2]=脏集合; ARGV[1]=上限 ARGV[2]=授权码id ARGV[3]=初始值
+# 返回 1=占用成功 0=已满 -1=计数键不存在且未提供初始值
+_ACQUIRE_LUA = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    if ARGV[3] == '' then
+        return -1
+    end
+    redis.call('SET', KEYS[1], ARGV[3], 'NX')
+end
+if redis.call('INCR', KEYS[1]) > tonumber(ARGV[1]) then
+    redis.call('DECR', KEYS[1])
+    return 0
+end
+redis.call('SADD', KEYS[2], ARGV[2])
+return 1
+"""
+
+# KEYS[1]=计数键 KEYS[2]=脏集合; ARGV[1]=授权码id
+# 返回 1=已释放 -1=计数键不存在
+_RELEASE_LUA = """
+local n = redis.call('GET', KEYS[1])
+if not n then
+    return -1
+end
+if tonumber(n) > 0 then
+    redis.call('DECR', KEYS[1])
+end
+redis.call('SADD', KEYS[2], ARGV[1])
+return 1
+"""
+
+_acquire_script = redis_client.register_script(_ACQUIRE_LUA)
+_release_script = redis_client.register_script(_RELEASE_LUA)
+
+
+def online_counter_key(auth_code_id: int) -> str:
+    return f"authcode:{auth_code_id}:online"
+
+
+async def acquire_online_slot(
+    db: AsyncSession, auth_code_id: int, max_online: int
+) -> Optional[bool]:
+    """占用一个在线名额
+
+    返回 True/False 表示是否占用成功；Redis 不可用时返回 None。
+    计数键不存在（首次使用或 Redis 重启）时以数据库中的 current_online 为初始值。
+    """
+    keys = [online_counter_key(auth_code_id), ONLINE_DIRTY_KEY]
+    try:
+        acquired = await _acquire_script(keys=keys, args=[max_online, auth_code_id, ""])
+        if acquired == -1:
+            result = await db.execute(
+                select(AuthCode.current_online).where(AuthCode.id == auth_code_id)
+            )
+            current = result.scalar() or 0
+            acquired = await _acquire_script(
+                keys=keys, args=[max_online, auth_code_id, current]
+            )
+    except (RedisError, OSError) as e:
+        logger.warning(
+            "acquire online slot for auth_code %s failed: %s", auth_code_id, e
+        )
+        return None
+    return acquired == 1
+
+
+async def release_online_slot(auth_code_id: int) -> bool:
+    """释放一个在线名额
+
+    返回 False 表示 Redis 不可用或计数键不存在，调用方需在数据库中扣减。
+    """
+    keys = [online_counter_key(auth_code_id), ONLINE_DIRTY_KEY]
+    try:
+        released = await _release_script(keys=keys, args=[auth_code_id])
+    except (RedisError, OSError) as e:
+        logger.warning(
+            "release online slot for auth_code %s failed: %s", auth_code_id, e
+        )
+        return False
+    return released == 1
+
+
+async def sync_online_counters() -> int:
+    """把 Redis 中有变动的在线计数写回数据库，返回写回的条数"""
+    try:
+        async with redis_client.pipeline(transaction=True) as pipe:
+            pipe.smembers(ONLINE_DIRTY_KEY)
+            pipe.delete(ONLINE_DIRTY_KEY)
+            dirty_ids, _ = await pipe.execute()
+        if not dirty_ids:
+            return 0
+        auth_code_ids = sorted(int(i) for i in dirty_ids)
+        counts = await redis_client.mget([online_counter_key(i) for i in auth_code_ids])
+    except (RedisError, OSError) as e:
+        logger.warning("load online counters failed: %s", e)
+        return 0
+
+    rows = [
+        {"b_id": auth_code_id, "b_online": int(count)}
+        for auth_code_id, count in zip(auth_code_ids, counts)
+        if count is not None
+    ]
+    if not rows:
+        return 0
+
+    table = AuthCode.__table__
+    try:
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                table.update()
+                .where(table.c.id == bindparam("b_id"))
+                .values(current_online=bindparam("b_online")),
+                rows,
+            )
+            await db.commit()
+    except Exception:
+        # 写库失败时放回脏集合，下一轮重试
+        try:
+            await redis_client.sadd(ONLINE_DIRTY_KEY, *auth_code_ids)
+        except (RedisError, OSError):
+            pass
+        raise
+    return len(rows)
+
+
+async def run_online_counter_sync(interval: int = ONLINE_SYNC_INTERVAL) -> None:
+    """后台循环：定期回写在线计数"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await sync_online_counters()
+        except Exception as e:
+            logger.warning("sync online counters failed: %s", e)
@@ -1,4 +1,4 @@
-from typing import Any
+from typing import Any, Optional
 
 # Invisible/control characters often appearing in uploaded files
 INVISIBLE_CHARS = ["\ufeff", "\u200b", "\u200e", "\u200f", "\u00a0"]
@@ -8,12 +8,14 @@ def _strip_invisible(s: str) -> str:
     """Remove common invisible/control characters and trim whitespace."""
     if not isinstance(s, str):
         return s
-    out = s
-    for c in INVISIBLE_CHARS:
-        out = out.replace(c, "")
+    # pure ASCII strings cannot contain any of the invisible chars;
+    # otherwise only pay for replace() when the char is actually present
+    if not s.isascii():
+        for c in INVISIBLE_CHARS:
+            if c in s:
+                s = s.replace(c, "")
     # trim common leading/trailing whitespace after removal
-    out = out.strip()
-    return out
+    return s.strip()
 
 
 def normalize_json_keys(obj: Any) -> Any:
@@ -25,13 +27,10 @@ def normalize_json_keys(obj: Any) -> Any:
     - Other types: returned unchanged.
     """
     if isinstance(obj, dict):
-        new = {}
-        for k, v in obj.items():
-            nk = k
-            if isinstance(k, str):
-                nk = _strip_invisible(k)
-            new[nk] = normalize_json_keys(v)
-        return new
+        return {
+            (_strip_invisible(k) if isinstance(k, str) else k): normalize_json_keys(v)
+            for k, v in obj.items()
+        }
 
     if isinstance(obj, list):
         return [normalize_json_keys(v) for v in obj]
@@ -44,6 +43,13 @@ def normalize_json_keys(obj: Any) -> Any:
 
     return obj
 
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match 请求头是否包含给定的 ETag（忽略弱校验前缀 W/）"""
+    if not if_none_match:
+        return False
+    return etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
+
 """
 字段检测和格式分析工具 - 支持更完整的字段扫描和格式冲突检测
 """
@@ -56,7 +62,7 @@ class FieldDetectionUtils:
     """字段检测工具类"""
 
     # 字段类型映射
-    QUESTION_FIELD_KEYS = [
+    QUESTION_FIELD_KEYS = (
         "instruction",
         "question",
         "prompt",
@@ -65,8 +71,8 @@ class FieldDetectionUtils:
         "user",
         "human",
         "q",
-    ]
-    ANSWER_FIELD_KEYS = [
+    )
+    ANSWER_FIELD_KEYS = (
         "output",
         "answer",
         "completion",
@@ -75,18 +81,18 @@ class FieldDetectionUtils:
         "bot",
         "reply",
         "a",
-    ]
-    THINKING_FIELD_KEYS = [
+    )
+    THINKING_FIELD_KEYS = (
         "thinking",
         "reasoning",
         "thought",
         "chain_of_thought",
         "cot",
         "rationale",
-    ]
-    CONTEXT_FIELD_KEYS = ["system", "system_prompt", "context", "instruction_prefix"]
-    MESSAGES_FIELD_KEYS = ["messages", "conversations", "dialogue", "chat", "turns"]
-    IMAGE_FIELD_KEYS = ["image", "images", "img", "imgs", "picture", "pictures"]
+    )
+    CONTEXT_FIELD_KEYS = ("system", "system_prompt", "context", "instruction_prefix")
+    MESSAGES_FIELD_KEYS = ("messages", "conversations", "dialogue", "chat", "turns")
+    IMAGE_FIELD_KEYS = ("image", "images", "img", "imgs", "picture", "pictures")
 
     @staticmethod
     def scan_all_fields(
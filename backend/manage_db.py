@@ -10,6 +10,8 @@ from app.core.config import settings
 # 数据库迁移表名
 MIGRATION_TABLE = "schema_migrations"
 MIGRATIONS_DIR = "migrations"
+# 迁移文件中单独一行写此注释时, 不在事务中执行 (见 execute_migration_sql)
+NO_TRANSACTION_DIRECTIVE = "-- no-transaction"
 
 async def get_db_engine():
     """获取数据库引擎"""
@@ -54,43 +56,69 @@ async def get_applied_migrations(conn):
         # 表可能不存在
         return set()
 
+def is_no_transaction(sql):
+    """迁移文件是否声明了 "-- no-transaction" (如 CREATE INDEX CONCURRENTLY 不能在事务中执行)"""
+    return any(
+        line.strip().lower() == NO_TRANSACTION_DIRECTIVE
+        for line in sql.splitlines()
+    )
+
+async def execute_migration_sql(engine, sql, record_sql, version):
+    """执行一个迁移文件并记录版本
+
+    普通迁移与版本记录在同一事务中提交; 声明了 no-transaction 的迁移在自动提交模式下逐条执行,
+    中途失败时已执行的语句不会回滚, 迁移 SQL 需可重复执行 (IF NOT EXISTS / IF EXISTS)。
+    """
+    statements = [s for s in sql.split(';') if s.strip()]
+    if is_no_transaction(sql):
+        async with engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            for statement in statements:
+                await conn.execute(text(statement))
+            await conn.execute(text(record_sql), {"v": version})
+    else:
+        async with engine.begin() as conn:
+            for statement in statements:
+                await conn.execute(text(statement))
+            await conn.execute(text(record_sql), {"v": version})
+
 async def upgrade(fake=False):
     engine = await get_db_engine()
     async with engine.begin() as conn:
         await init_migration_table(conn)
         applied = await get_applied_migrations(conn)
-        
-        all_migrations = get_migration_files()
-        
-        print(f"Found {len(all_migrations)} migrations.")
-        
-        for version, files in all_migrations:
-            if version in applied:
-                continue
-                
-            if 'up' not in files:
-                print(f"Skipping {version}: missing up.sql")
-                continue
-                
-            print(f"Applying {version} (fake={fake})...")
-            
-            try:
-                if not fake:
-                    with open(files['up'], 'r', encoding='utf-8') as f:
-                        sql = f.read()
-                    
-                    # 支持多条语句 (简单分割，虽然通常是一个文件)
-                    # 注意：某些复杂的 PL/pgSQL 可能不能简单分割
-                    for statement in sql.split(';'):
-                        if statement.strip():
-                            await conn.execute(text(statement))
-                
-                await conn.execute(text(f"INSERT INTO {MIGRATION_TABLE} (version) VALUES (:v)"), {"v": version})
-                print(f"✅ Applied {version}")
-            except Exception as e:
-                print(f"❌ Failed to apply {version}: {e}")
-                # 事务会自动回滚
-                raise e
+
+    all_migrations = get_migration_files()
+
+    print(f"Found {len(all_migrations)} migrations.")
+
+    # 每个迁移单独提交, 这样 no-transaction 迁移执行时前面的迁移已生效且不再持有锁
+    for version, files in all_migrations:
+        if version in applied:
+            continue
+
+        if 'up' not in files:
+            print(f"Skipping {version}: missing up.sql")
+            continue
+
+        print(f"Applying {version} (fake={fake})...")
+
+        try:
+            sql = ""
+            if not fake:
+                with open(files['up'], 'r', encoding='utf-8') as f:
+                    sql = f.read()
+
+            # 支持多条语句 (简单分割，虽然通常是一个文件)
+            # 注意：某些复杂的 PL/pgSQL 可能不能简单分割
+            await execute_migration_sql(
+                engine, sql, f"INSERT INTO {MIGRATION_TABLE} (version) VALUES (:v)", version
+            )
+            print(f"✅ Applied {version}")
+        except Exception as e:
+            print(f"❌ Failed to apply {version}: {e}")
+            # 当前迁移的事务会自动回滚, 之前的迁移已提交
+            raise e
 
 async def downgrade(steps=1):
     engine = await get_db_engine()
@@ -99,37 +127,35 @@ async def downgrade(steps=1):
         # 获取所有已应用的，按倒序排列
         result = await conn.execute(text(f"SELECT version FROM {MIGRATION_TABLE} ORDER BY version DESC"))
         applied_versions = [row[0] for row in result.fetchall()]
-        
-        if not applied_versions:
-            print("No migrations to rollback.")
-            return
-
-        # 确定要回滚的版本
-        to_rollback = applied_versions[:steps]
-        
-        # 获取文件映射
-        all_migrations_map = dict(get_migration_files())
-        
-        for version in to_rollback:
-            files = all_migrations_map.get(version)
-            if not files or 'down' not in files:
-                print(f"❌ Cannot rollback {version}: missing down.sql")
-                break # 停止回滚，保证一致性
-            
-            print(f"Rolling back {version}...")
-            with open(files['down'], 'r', encoding='utf-8') as f:
-                sql = f.read()
-            
-            try:
-                for statement in sql.split(';'):
-                   if statement.strip():
-                        await conn.execute(text(statement))
-                
-                await conn.execute(text(f"DELETE FROM {MIGRATION_TABLE} WHERE version = :v"), {"v": version})
-                print(f"✅ Rolled back {version}")
-            except Exception as e:
-                print(f"❌ Failed to rollback {version}: {e}")
-                raise e
+
+    if not applied_versions:
+        print("No migrations to rollback.")
+        return
+
+    # 确定要回滚的版本
+    to_rollback = applied_versions[:steps]
+
+    # 获取文件映射
+    all_migrations_map = dict(get_migration_files())
+
+    for version in to_rollback:
+        files = all_migrations_map.get(version)
+        if not files or 'down' not in files:
+            print(f"❌ Cannot rollback {version}: missing down.sql")
+            break # 停止回滚，保证一致性
+
+        print(f"Rolling back {version}...")
+        with open(files['down'], 'r', encoding='utf-8') as f:
+            sql = f.read()
+
+        try:
+            await execute_migration_sql(
+                engine, sql, f"DELETE FROM {MIGRATION_TABLE} WHERE version = :v", version
+            )
+            print(f"✅ Rolled back {version}")
+        except Exception as e:
+            print(f"❌ Failed to rollback {version}: {e}")
+            raise e
 
 if __name__ == "__main__":
     import argparse
@@ -0,0 +1,2 @@
+-- Down Migration
+DROP INDEX uq_auth_code_reviewed_items_code_item;
@@ -0,0 +1,8 @@
+-- Up Migration
+DELETE FROM auth_code_reviewed_items a
+USING auth_code_reviewed_items b
+WHERE a.auth_code_id = b.auth_code_id
+  AND a.item_id = b.item_id
+  AND a.id > b.id;
+
+CREATE UNIQUE INDEX uq_auth_code_reviewed_items_code_item ON auth_code_reviewed_items (auth_code_id, item_id);
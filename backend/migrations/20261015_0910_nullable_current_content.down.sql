@@ -0,0 +1,6 @@
+-- Down Migration
+UPDATE data_items
+SET current_content = original_content
+WHERE current_content IS NULL;
+
+ALTER TABLE data_items ALTER COLUMN current_content SET NOT NULL;
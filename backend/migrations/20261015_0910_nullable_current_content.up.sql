@@ -0,0 +1,13 @@
+-- Up Migration
+ALTER TABLE data_items ALTER COLUMN current_content DROP NOT NULL;
+
+-- 未修改的条目不再重复存储当前内容 (NULL 即与原始内容相同)
+-- 按 JSONB 比较值是否相同 (忽略键顺序和空白), 与运行时的判断一致; 列类型仍为 JSON
+-- 含 \u0000 的内容无法转为 JSONB, 这类行保留原样
+UPDATE data_items
+SET current_content = NULL
+WHERE CASE
+    WHEN current_content::text LIKE '%\\u0000%'
+        OR original_content::text LIKE '%\\u0000%' THEN false
+    ELSE current_content::jsonb = original_content::jsonb
+END;
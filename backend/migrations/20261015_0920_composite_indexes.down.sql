@@ -0,0 +1,6 @@
+-- Down Migration
+-- no-transaction
+-- DROP INDEX CONCURRENTLY 不能在事务中执行 (manage_db.py 按上面的标记以自动提交方式执行)
+DROP INDEX CONCURRENTLY IF EXISTS ix_folders_owner_parent_name;
+DROP INDEX CONCURRENTLY IF EXISTS ix_data_items_dataset_status;
+DROP INDEX CONCURRENTLY IF EXISTS ix_data_items_dataset_seq;
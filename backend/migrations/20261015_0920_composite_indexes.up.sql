@@ -0,0 +1,9 @@
+-- Up Migration
+-- no-transaction
+-- CONCURRENTLY 建索引期间不阻塞写入, 但不能在事务中执行 (manage_db.py 按上面的标记以自动提交方式执行)。
+-- 建索引中途失败会留下 INVALID 索引, 重试前需先 DROP INDEX CONCURRENTLY 该索引。
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_data_items_dataset_seq ON data_items (dataset_id, seq_num);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_data_items_dataset_status ON data_items (dataset_id, status);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_folders_owner_parent_name ON folders (owner_id, parent_id, name);
+-- add_folder_support.sql 已创建, 未执行过该脚本的库在此补上
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_datasets_folder_id ON datasets (folder_id);
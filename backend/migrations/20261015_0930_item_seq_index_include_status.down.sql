@@ -0,0 +1,6 @@
+-- Down Migration
+-- no-transaction
+-- CONCURRENTLY 建/删索引不能在事务中执行 (manage_db.py 按上面的标记以自动提交方式执行)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_data_items_dataset_id ON data_items (dataset_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_data_items_dataset_seq ON data_items (dataset_id, seq_num);
+DROP INDEX CONCURRENTLY IF EXISTS ix_data_items_dataset_seq_status;
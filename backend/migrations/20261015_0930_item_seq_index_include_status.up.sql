@@ -0,0 +1,9 @@
+-- Up Migration
+-- no-transaction
+-- CONCURRENTLY 建/删索引期间不阻塞写入, 但不能在事务中执行 (manage_db.py 按上面的标记以自动提交方式执行)。
+-- 建索引中途失败会留下 INVALID 索引, 重试前需先 DROP INDEX CONCURRENTLY 该索引。
+-- 分页索引附带 status, 任务进度 (序号范围内非待审核数) 可走仅索引扫描
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_data_items_dataset_seq_status ON data_items (dataset_id, seq_num) INCLUDE (status);
+DROP INDEX CONCURRENTLY IF EXISTS ix_data_items_dataset_seq;
+-- dataset_id 单列索引已被 (dataset_id, seq_num) 复合索引的前缀覆盖
+DROP INDEX CONCURRENTLY IF EXISTS ix_data_items_dataset_id;